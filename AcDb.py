@@ -8,13 +8,91 @@ Created on Tue Jun  1 16:32:46 2021
 
 
 import json
+import re
+import codecs
 import collections
-import uuid
+import os
+import tempfile
+import hashlib
+import functools
+import mmap
+import string
 import numpy as np
 import logging
+import sqlite3
+import concurrent.futures
+import weakref
+import time
+import tracemalloc
+import csv
+import itertools
 MAPTYPES = (dict, collections.abc.Mapping)
 KNOWN_TITER_SYMBOLS = ['<', '>', '/', '*', ' ', '?']
 REQUIRED_EXP_KEYS = ['titers', 'antigen_ids', 'serum_ids', 'assay', 'file', 'conducted_by']
+ID_ALPHABET = np.array(list(string.digits + string.ascii_uppercase))
+ID_LENGTH = 6
+ID_SPACE_WARNING = 0.5  #  a warning is logged when this fraction of the id space is used
+SNAPSHOT_FORMAT = 1
+SHARDS_FORMAT = 1
+DIGEST_CHUNK = 1024  #  number of entry digests hashed together below the root hash, see root_hash
+VALIDATION_CACHE_SIZE = 2**27  #  bytes, the least recently used records are evicted beyond this
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS antigens (key INTEGER PRIMARY KEY, id TEXT NOT NULL, pos INTEGER NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS antigens_id ON antigens(id);
+CREATE INDEX IF NOT EXISTS antigens_pos ON antigens(pos);
+CREATE TABLE IF NOT EXISTS sera (key INTEGER PRIMARY KEY, id TEXT NOT NULL, pos INTEGER NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS sera_id ON sera(id);
+CREATE INDEX IF NOT EXISTS sera_pos ON sera(pos);
+CREATE TABLE IF NOT EXISTS experiments (key INTEGER PRIMARY KEY, id TEXT NOT NULL, pos INTEGER NOT NULL, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS experiments_id ON experiments(id);
+CREATE INDEX IF NOT EXISTS experiments_pos ON experiments(pos);
+CREATE TABLE IF NOT EXISTS results (experiment_key INTEGER NOT NULL REFERENCES experiments(key) ON DELETE CASCADE,
+                                    result_index INTEGER NOT NULL, assay TEXT, date TEXT, titer_rows INTEGER NOT NULL,
+                                    PRIMARY KEY (experiment_key, result_index));
+CREATE INDEX IF NOT EXISTS results_assay ON results(assay);
+CREATE TABLE IF NOT EXISTS result_antigens (experiment_key INTEGER NOT NULL REFERENCES experiments(key) ON DELETE CASCADE,
+                                            result_index INTEGER NOT NULL, row INTEGER NOT NULL, antigen_id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS result_antigens_id ON result_antigens(antigen_id);
+CREATE INDEX IF NOT EXISTS result_antigens_key ON result_antigens(experiment_key, result_index);
+CREATE TABLE IF NOT EXISTS result_sera (experiment_key INTEGER NOT NULL REFERENCES experiments(key) ON DELETE CASCADE,
+                                        result_index INTEGER NOT NULL, col INTEGER NOT NULL, serum_id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS result_sera_id ON result_sera(serum_id);
+CREATE INDEX IF NOT EXISTS result_sera_key ON result_sera(experiment_key, result_index);
+CREATE TABLE IF NOT EXISTS titers (experiment_key INTEGER NOT NULL REFERENCES experiments(key) ON DELETE CASCADE,
+                                   result_index INTEGER NOT NULL, row INTEGER NOT NULL, col INTEGER NOT NULL, titer TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS titers_key ON titers(experiment_key, result_index);
+'''
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+TITER_QUALIFIERS = ['', '<', '>', '/', '*', '?', 'missing', 'unparsed']  #  the int8 codes of titer_table qualifiers
+TITER_ROW_FIELDS = ['experiment_id', 'result_index', 'assay', 'date', 'antigen_id', 'serum_id', 'titer']
+TITER_ROW_DTYPE = np.dtype([('experiment_id', f'U{ID_LENGTH}'), ('result_index', np.int32), ('assay', 'U16'), ('date', 'U10'),
+                            ('antigen_id', f'U{ID_LENGTH}'), ('serum_id', f'U{ID_LENGTH}'), ('titer', 'U16')])  #  string widths are minimums, see titer_records
+INVALID_TITER_CHARACTER = re.compile('[^' + re.escape(''.join(KNOWN_TITER_SYMBOLS)) + r'\d]')
+TITER_PATTERN = re.compile(r'([<>]?)(\d+)$|(\d+)/(\d+)$|([*?])$|$')
+
+
+def _instrumented(op):
+    '''records the calls of a db_list method under op when the list is instrumented, see db_list.instrument'''
+    
+    def decorator(method):
+        
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            
+            if self._stats is None:
+                return method(self, *args, **kwargs)
+            
+            record = self._start_measure(op)
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._stop_measure(record)
+                
+        return wrapper
+    
+    return decorator
+
 
 class db_list():
     '''
@@ -29,22 +107,82 @@ class db_list():
         
     '''
     
-    def __init__(self, json_path, name=None, do_tests=True):
+    def __init__(self, json_path, name=None, do_tests=True, stream=False, memory_budget=None,
+                 lazy=False, use_mmap=False, workers=None, executor='process', journal=False,
+                 snapshot=False, sqlite_table=None, validation_cache=None, revalidate=False, shards=False,
+                 shard_key=None, instrument=False, trace_memory=False):
+        
+        '''
+        json_path is the path of a json file which contains a list of dictionaries.
+        
+        If stream is True the file is parsed one entry at a time and each entry is
+        checked and indexed as it arrives, instead of loading the whole file and
+        checking it afterwards. memory_budget (in characters) then bounds the
+        text buffered for a single entry. Open file objects can be given as
+        json_path (or to from_stream) in which case streaming is always used.
+        
+        If lazy is True, only the ids and byte offsets of the entries are read from
+        a sidecar index file (json_path + '.idx', created by a one-time scan and
+        rebuilt when the json file changes). Entries are then parsed, checked and
+        cached on first access. With use_mmap the json file is memory mapped.
+        
+        With workers > 1 the entries of a fully loaded list are checked in a pool
+        of that many processes (or threads if executor='thread') and the errors of
+        all the entries are reported together. Worker processes parse their share
+        of the json file themselves from the byte offsets of the sidecar index of
+        lazy mode (built on the first such load), so that entries are not pickled.
+        Streamed and lazy lists check their entries one by one as they arrive.
+        
+        If journal is True, additions and removals are recorded in the append-only
+        file json_path + '.journal' which is replayed on top of the json file when
+        it is loaded again. compact (or writing to json_path) folds the journal
+        back into the json file.
         
-        assert isinstance(json_path,str)
+        If snapshot is True, json_path is a snapshot directory written by
+        save_snapshot, see load_snapshot. Entries are then built from its memory
+        mapped arrays and checked on first access, like in lazy mode.
         
-        with open(json_path, 'r') as fileobj:
-            self._list = json.load(fileobj)
+        If sqlite_table is given, json_path is the path of a sqlite_store (or the
+        store itself) and the entries are read from and written to that table,
+        see from_sqlite.
         
-        assert len(self._list)>0, 'list contains no elements'    
+        validation_cache is a directory in which the lists record that their json
+        files passed the tests run on loading. A file which is unchanged (same size
+        and modification time, or else same content hash) is not tested again and
+        otherwise only the entries whose digests are not recorded are tested. The
+        directory is kept under VALIDATION_CACHE_SIZE bytes by evicting the least
+        recently used records. revalidate=True tests everything regardless.
         
+        If shards is True, json_path is a directory of json shards written by
+        write_shards, see from_shards.
+        
+        instrument=True (or a callback) records statistics of the operations on the
+        list starting with loading it, see instrument.
+        '''
+        
+        assert isinstance(json_path,(str, sqlite_store)) or hasattr(json_path, 'read'), 'json_path should be a path or a file object'
         
         if name is None:
             name = ''
             
         self.name = name
-            
-        self._id_list = [x['id'] for x in self._list]
+        
+        self._listeners = []  #  callbacks notified when entries are added or removed
+        self._replaying = False
+        self._journal = None
+        self._json_path = json_path if isinstance(json_path,str) and not snapshot and sqlite_table is None and not shards else None
+        self._edited = False  #  whether the list differs from its json file
+        self._view_of = None  #  the list this list is a view of, see view
+        self._digest_list = None  #  digests of the entries, built on first use, see root_hash
+        self._chunk_hashes = []
+        self._shard_list = None  #  the shard file of each entry of a sharded list, see from_shards
+        self._shard_key = shard_key
+        
+        self.instrument(bool(instrument), instrument if callable(instrument) else None, trace_memory)
+        load_record = self._start_measure('load') if self._stats is not None else None
+        
+        self._reserved_ids = set()  #  ids handed out by generate_new_ids but not added yet
+        self._id_rng = np.random.default_rng()
         
         self._check_new_entries = True  #  WARNING: turn off at your own expense. 
                                     #  This is a check used when adding new entries
@@ -52,8 +190,367 @@ class db_list():
         self._do_tests = do_tests  #  WARNING: turn off at your own expense. 
                                #  This is for testing the lists when loading them
                                
+        self._workers = workers
+        self._executor = executor
+        self._validation_cache = validation_cache
+        self._revalidate = revalidate
+        self._raw_text = None  #  the json text and the spans of its entries, see _untested
+        self._raw_spans = None
+                               
+        if sqlite_table is not None:
+            self._load_mode = 'sqlite'
+        elif shards:
+            self._load_mode = 'sharded'
+        elif snapshot:
+            self._load_mode = 'snapshot'
+        elif lazy:
+            self._load_mode = 'lazy'
+        elif stream or not isinstance(json_path,str):
+            self._load_mode = 'stream'
+        else:
+            self._load_mode = 'full'
+        
+        if self._load_mode in ('lazy', 'snapshot', 'sqlite'):
+            assert isinstance(json_path,(str, sqlite_store)), f'{self._load_mode} loading requires a path'
+            
+            if self._load_mode == 'sqlite':
+                store = json_path if isinstance(json_path, sqlite_store) else sqlite_store(json_path)
+                self._list = _sqlite_entries(store, sqlite_table, self._test_entry if do_tests else None)
+                self._id_list = list(self._list.ids)
+            elif self._load_mode == 'lazy':
+                offsets, self._id_list = _byte_index(json_path)
+                self._list = _lazy_entries(offsets, _json_slices(json_path, use_mmap), self._test_entry if do_tests else None)
+            else:
+                arrays, meta = _read_snapshot(json_path)
+                assert meta['kind'] == self.__class__.__name__, f'{json_path} is a snapshot of a {meta["kind"]}'
+                
+                self._id_list = arrays['ids'].tolist()
+                self._snapshot_opened(arrays, meta)
+                self._list = _lazy_entries([(x,) for x in range(len(self._id_list))], functools.partial(self._snapshot_entry, arrays, meta),
+                                           self._test_entry if do_tests else None,
+                                           functools.partial(self._snapshot_entry, arrays, meta, cache=False))
+            
+            assert len(self._list)>0, 'list contains no elements'
+            
+            self._id_index = {}
+            self._index_ids()
+            
+            if self._do_tests:
+                assert len(self._id_list) == len(self._id_index), 'Some ids appear multiple times'
+        
+        elif self._load_mode == 'stream':
+            self._list = []
+            self._id_list = []
+            self._id_index = {}
+            
+            if isinstance(json_path,str):
+                with open(json_path, 'r') as fileobj:
+                    self._load_stream(fileobj, memory_budget)
+            else:
+                self._load_stream(json_path, memory_budget)
+                
+            assert len(self._list)>0, 'list contains no elements'
+            
+        elif self._load_mode == 'sharded':
+            self._load_shards(json_path)
+            
+        else:
+            with open(json_path, 'r') as fileobj:
+                if validation_cache is not None and do_tests:
+                    # the text of each entry is kept until _untested digests it
+                    self._raw_text = fileobj.read()
+                    self._list, self._raw_spans = _parse_json_array(self._raw_text)
+                else:
+                    self._list = json.load(fileobj)
+            
+            assert len(self._list)>0, 'list contains no elements'    
+            
+            self._id_list = [x['id'] for x in self._list]
+            
+            self._id_index = {}  #  id -> position of its first occurrence in the list
+            self._index_ids()
+                               
+            if self._do_tests:
+                self._parent_tests()
+                
+        if journal:
+            assert self._json_path is not None, 'journaling requires a json path'
+            self._open_journal()
+            
+        if load_record is not None:
+            self._count(entries=len(self._list), bytes_read=os.path.getsize(json_path) if isinstance(json_path, str) and os.path.isfile(json_path) else 0)
+            self._stop_measure(load_record)
+                
+    @classmethod
+    def from_sqlite(cls, db_path, table, name=None, **kwargs):
+        
+        '''
+        opens the table ('antigens', 'sera' or 'experiments') of the sqlite_store at
+        db_path (or a sqlite_store instance) as a list. Only the ids are read when
+        the list is opened, entries are read when they are accessed and additions
+        and removals are written through to the database. Entries are read anew on
+        each access so in-place edits of them are not stored.
+        
+        Several lists (also in other processes) can be opened on the same table.
+        Each sees the entries that were in the table when it was opened, and its
+        writes raise a RuntimeError once another list has changed the table.
+        '''
+        
+        return cls(db_path, name, sqlite_table=table, **kwargs)
+    
+    @classmethod
+    def from_shards(cls, directory, name=None, shard_key=None, **kwargs):
+        
+        '''
+        loads the list from a directory of json shards and their manifest.json,
+        written by write_shards. Shards are read in parallel (in workers processes,
+        or threads if executor='thread', by default one per shard up to the number
+        of cores) and the entries are in the order of the shards. Ids are checked
+        to be unique across all the shards.
+        
+        New entries go to the shard shard_key(entry) if shard_key is given (a file
+        name without the .json extension, shards are created as needed) and otherwise
+        to the shard of the entry before them. write_shards then rewrites only the
+        shards which have changed.
+        '''
+        
+        return cls(directory, name, shards=True, shard_key=shard_key, **kwargs)
+    
+    def _load_shards(self, directory):
+        
+        with open(os.path.join(directory, 'manifest.json'), 'r') as fileobj:
+            manifest = json.load(fileobj)
+            
+        assert manifest['format'] == SHARDS_FORMAT, f'shard directory {directory} has an unknown format'
+        assert manifest['kind'] == self.__class__.__name__, f'{directory} holds the shards of a {manifest["kind"]}'
+        
+        files = [x['file'] for x in manifest['shards']]
+        paths = [os.path.join(directory, x) for x in files]
+        workers = self._workers if self._workers is not None else min(len(paths), os.cpu_count() or 1)
+        
+        if workers > 1:
+            pool_class = concurrent.futures.ThreadPoolExecutor if self._executor == 'thread' else concurrent.futures.ProcessPoolExecutor
+            with pool_class(max_workers=workers) as pool:
+                shard_entries = list(pool.map(_load_shard, paths))
+        else:
+            shard_entries = [_load_shard(x) for x in paths]
+            
+        for shard, entries in zip(manifest['shards'], shard_entries):
+            assert len(entries) == shard['count'], f'shard {shard["file"]} has {len(entries)} entries, the manifest lists {shard["count"]}'
+            
+        if self._stats is not None:
+            self._count(bytes_read=sum(os.path.getsize(x) for x in paths))
+            
+        self._shard_dir = directory
+        self._shard_files = files
+        self._dirty_shards = set()
+        self._list = [x for entries in shard_entries for x in entries]
+        self._shard_list = [name for name, entries in zip(files, shard_entries) for _ in entries]
+        
+        assert len(self._list)>0, 'list contains no elements'
+        
+        self._id_list = [x['id'] for x in self._list]
+        self._id_index = {}
+        self._index_ids()
+        
         if self._do_tests:
+            if len(self._id_list) != len(self._id_index):
+                duplicates = {x for x,count in collections.Counter(self._id_list).items() if count>1}
+                shards = sorted({name for eid, name in zip(self._id_list, self._shard_list) if eid in duplicates})
+                raise AssertionError(f'ids {sorted(duplicates)} appear multiple times in the shards {shards}')
+            
             self._parent_tests()
+            
+    def _update_shards(self, op, ii, entries):
+        
+        if op == 'insert':
+            
+            neighbour = self._shard_list[ii-1] if ii>0 else (self._shard_list[0] if len(self._shard_list)>0 else self._shard_files[-1])
+            names = [self._shard_key(x) + '.json' if self._shard_key is not None else neighbour for x in entries]
+            
+            self._shard_list[ii:ii] = names
+            self._dirty_shards.update(names)
+            self._shard_files.extend(x for x in dict.fromkeys(names) if x not in self._shard_files)
+            
+        elif op == 'reverse':
+            self._shard_list.reverse()
+            self._dirty_shards.update(self._shard_files)
+            
+        else:
+            positions = [ii] if op == 'pop' else ii
+            
+            for pos in sorted(positions, reverse=True):
+                self._dirty_shards.add(self._shard_list.pop(pos))
+                
+    @_instrumented('write_shards')
+    def write_shards(self, directory=None, key=None, compact=False):
+        
+        '''
+        writes the list as a directory of json shards and a manifest.json which
+        lists them. key(entry) gives the name of the shard of each entry (for example
+        its year or project). Without key, a sharded list keeps its shards, and when
+        it writes to its own directory only the shards which changed are written.
+        Each shard is written like write, the manifest is replaced last. When a
+        sharded list writes to its own directory it takes the new layout, and the
+        files of its shards which are no longer in the manifest are removed.
+        '''
+        
+        self._assert_can_write()
+        
+        if key is not None:
+            names = [key(x) + '.json' for x in self._list]
+            files = list(dict.fromkeys(names))
+        else:
+            assert self._shard_list is not None, 'provide key to shard a list which is not sharded'
+            names = self._shard_list
+            files = self._shard_files
+            
+        assert directory is not None or self._shard_list is not None, 'provide the directory to write the shards to'
+        
+        directory = self._shard_dir if directory is None else directory
+        in_place = self._shard_list is not None and os.path.abspath(directory) == os.path.abspath(self._shard_dir)
+        own = key is None and in_place
+        
+        os.makedirs(directory, exist_ok=True)
+        
+        grouped = {x:[] for x in files}
+        for entry, name in zip(self._list, names):
+            grouped[name].append(entry)
+            
+        # shards whose entries were all removed are left out of the manifest
+        files = [x for x in files if len(grouped[x])>0]
+        
+        for name in files:
+            if not own or name in self._dirty_shards:
+                _write_entries(grouped[name], os.path.join(directory, name), compact)
+                
+                if self._stats is not None:
+                    self._count(entries=len(grouped[name]), bytes_written=os.path.getsize(os.path.join(directory, name)))
+                
+        manifest = {'format':SHARDS_FORMAT, 'kind':self.__class__.__name__,
+                    'shards':[{'file':x, 'count':len(grouped[x])} for x in files]}
+        manifest_path = os.path.join(directory, 'manifest.json')
+        
+        with open(manifest_path + '.tmp', 'w') as fileobj:
+            json.dump(manifest, fileobj, indent=4)
+            
+        os.replace(manifest_path + '.tmp', manifest_path)
+        
+        if in_place:
+            for name in set(self._shard_files) - set(files):
+                if os.path.exists(os.path.join(directory, name)):
+                    os.remove(os.path.join(directory, name))
+                    
+            self._shard_list = list(names)
+            self._shard_files = files
+            self._dirty_shards = set()
+            
+    def _assert_can_write(self):
+        '''hook for child classes which need to check the list before it is written'''
+        pass
+    
+    @classmethod
+    def load_snapshot(cls, path, json_path=None, **kwargs):
+        
+        '''
+        loads a list from a snapshot directory written by save_snapshot. If json_path
+        is given and the snapshot does not exist or was not made from the current
+        content of json_path (compared by sha256), the list is loaded from json_path
+        instead and the snapshot is rebuilt.
+        '''
+        
+        if json_path is not None:
+            
+            meta_path = os.path.join(path, 'meta.json')
+            source_hash = _file_digest(json_path)
+            
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r') as fileobj:
+                    meta = json.load(fileobj)
+            else:
+                meta = None
+                
+            if meta is None or meta.get('source_hash') != source_hash or meta.get('format') != SNAPSHOT_FORMAT:
+                loaded_list = cls(json_path, **kwargs)
+                loaded_list.save_snapshot(path, _source_hash=source_hash)
+                return loaded_list
+        
+        return cls(path, snapshot=True, **kwargs)
+    
+    def save_snapshot(self, path, _source_hash=None):
+        
+        '''
+        saves the list into the directory path as a set of .npy arrays, which are
+        memory mapped when loaded, and a meta.json file. Entries are stored as
+        json in a byte array, child classes store some fields as typed arrays.
+        The snapshot records the sha256 of the json file of the list, unless the
+        list was edited since it was loaded.
+        '''
+        
+        if _source_hash is None and self._json_path is not None and not self._edited:
+            _source_hash = _file_digest(self._json_path)
+        
+        os.makedirs(path, exist_ok=True)
+        
+        # meta.json is removed first and written last so that an interrupted save is never loaded
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        
+        arrays, meta = self._snapshot_data()
+        
+        blobs = [json.dumps(self._snapshot_stub(x), ensure_ascii=False).encode('utf-8') for x in self._list]
+        arrays['ids'] = np.array(self._id_list, dtype=str)
+        arrays['entries'] = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+        arrays['entry_offsets'] = np.cumsum([0] + [len(x) for x in blobs], dtype=np.int64)
+        
+        for key, array in arrays.items():
+            np.save(os.path.join(path, key + '.npy'), array)
+            
+        meta.update({'format':SNAPSHOT_FORMAT, 'kind':self.__class__.__name__, 'source_hash':_source_hash})
+        
+        with open(meta_path + '.tmp', 'w') as fileobj:
+            json.dump(meta, fileobj, ensure_ascii=False)
+            
+        os.replace(meta_path + '.tmp', meta_path)
+        
+    def _snapshot_data(self):
+        '''hook for child classes which store fields as typed arrays, returns (arrays, meta)'''
+        return {}, {}
+    
+    def _snapshot_opened(self, arrays, meta):
+        '''hook for child classes which need to set up state from a snapshot being loaded'''
+        pass
+    
+    def _snapshot_stub(self, entry):
+        '''the part of an entry which is stored as json in a snapshot'''
+        return entry
+    
+    def _snapshot_entry(self, arrays, meta, pos, cache=True):
+        '''builds the entry at position pos of a snapshot, cache is False when the entry is not kept'''
+        
+        start, end = arrays['entry_offsets'][pos:pos+2]
+        
+        return json.loads(arrays['entries'][start:end].tobytes())
+    
+    @classmethod
+    def from_stream(cls, fileobj, name=None, **kwargs):
+        '''loads the list from an open (text or binary) file object one entry at a time'''
+        
+        return cls(fileobj, name, stream=True, **kwargs)
+    
+    def _load_stream(self, fileobj, memory_budget):
+        
+        for entry in _iter_json_array(fileobj, memory_budget):
+            
+            if self._do_tests:
+                assert isinstance(entry, dict), 'provide a json file which is a list of dictionaries'
+                assert entry['id'] not in self._id_index, 'Some ids appear multiple times'
+                self._test_entry(entry)
+            
+            self._id_index.setdefault(entry['id'], len(self._list))
+            self._id_list.append(entry['id'])
+            self._list.append(entry)
     
     def __repr__(self):
         return "<{0} {1}>".format(
@@ -63,17 +560,40 @@ class db_list():
         """List length"""
         return len(self._list)
     
+    def __contains__(self, eid):
+        """Membership is tested on ids"""
+        return eid in self._id_index
+    
     def __setitem__(self, val, ii):
         
         raise TypeError(f'Setting values not allowed for {self.__class__.__name__}')
 
     def __getitem__(self, ii):
-        """Get a list item"""
+        """Get a list item, slices are views of the list"""
+        
+        if isinstance(ii, slice):
+            return self.view(ii)
+        
         return self._list[ii]
 
     def __delitem__(self, ii):
+        self._assert_writable()
+        positions = range(len(self._list))[ii]
+        
+        if isinstance(positions, range):
+            if len(positions) == 0:
+                return
+            start = min(positions)
+        else:
+            start = positions
+            
+        removed = self._list[ii] if isinstance(positions, range) else [self._list[ii]]
+        
+        self._unindex_ids(start)
         self._list.__delitem__(ii)
-        self._id_list__delitem__(ii)
+        self._id_list.__delitem__(ii)
+        self._index_ids(start)
+        self._notify('delete', list(positions) if isinstance(positions, range) else [positions], removed)
         
     def __str__(self):
         return ''.join([str(x) + '\n' for x in self._list])
@@ -81,289 +601,2992 @@ class db_list():
     def __iter__(self):
         return iter(self._list)
     
+    @_instrumented('_test')
     def _test(self):
-        assert len(self._id_list) == len(set(self._id_list)), 'Non-uniqueness in the ids'
+        assert len(self._id_list) == len(self._id_index), 'Non-uniqueness in the ids'
         
-    def insert(self,ii,val):
-        raise TypeError(f'Insert is only defined for child classes of {self.__class__.__name__}')
+    def _test_entry(self, entry):
+        '''hook for the tests child classes run on each entry while loading'''
+        pass
     
-    def append(self, val):
-        raise TypeError(f'Append is only defined for child classes of {self.__class__.__name__}')
-
-        
-    def pop(self, ii):
-        self._list.pop(ii)
-        self._id_list.pop(ii)
+    def get_by_id(self, eid):
+        '''
+        returns the entry with the given id, raises a KeyError if there is none.
+        if the id appears multiple times the first occurrence is returned.
+        '''
+        return self._list[self._id_index[eid]]
+    
+    def _index_ids(self, start=0):
+        '''adds the ids from position start onwards to the id index'''
+        id_index = self._id_index
         
-    def reverse(self):
-        self._list.reverse()
-        self._id_list.reverse()
-
-    def generate_new_id(self, stop=10000):
+        for pos in range(start, len(self._id_list)):
+            id_index.setdefault(self._id_list[pos], pos)
+            
+    def _unindex_ids(self, start=0):
+        '''
+        removes the ids which are indexed at a position >= start. this is
+        called before the list is modified at start and followed by
+        _index_ids(start) once the modification is done
+        '''
+        id_index = self._id_index
         
-        is_unique = False
-        counter = 0
+        for eid in self._id_list[start:]:
+            if id_index.get(eid, -1) >= start:
+                del id_index[eid]
+                
+    def _insert(self, ii, val):
+        '''inserts an already checked entry and keeps the id index consistent'''
+        self._assert_writable()
+        start = slice(ii, None).indices(len(self._list))[0]
         
-        while not is_unique:
-            random_id = str(uuid.uuid4())
+        self._list.insert(start, val)
+        self._unindex_ids(start)
+        self._id_list.insert(start, val['id'])
+        self._reserved_ids.discard(val['id'])
+        self._index_ids(start)
+        self._notify('insert', start, [val])
+    
+    def _extend(self, entries):
+        '''appends a batch of already checked entries'''
+        self._assert_writable()
+        start = len(self._list)
         
-            random_id = random_id.upper()
+        self._list.extend(entries)
+        self._id_list.extend(x['id'] for x in entries)
+        self._reserved_ids.difference_update(self._id_list[start:])
+        self._index_ids(start)
+        self._notify('insert', start, entries)
         
-            random_id = random_id.replace("-","")
-            
-            counter +=1 
-            
-            if random_id not in self._id_list:
-                is_unique=True
-                
-            elif counter>stop:
-                assert f'Unique id could not be produced after {stop} steps, check your inputs'
+    def _check_batch(self, entries):
+        '''
+        checks a batch of entries to be added with _check_entry of the child class
+        and makes sure that their ids are also unique within the batch
+        '''
+        for entry in entries:
+            self._check_entry(entry)
             
+        duplicates = [x for x,count in collections.Counter(x['id'] for x in entries).items() if count>1]
+        
+        if len(duplicates)>0:
+            raise ValueError(f'ids {duplicates} appear multiple times in the entries to be added')
     
-        return random_id[0:6]
- 
-    
- 
-    def write(self, path):
-    
-        '''a save json function which is compatible
-        with the formatting of our datasets. This is overwritten
-        slightly in db_experiment_list for some extra functionality
+    def subscribe(self, callback):
         '''
+        registers callback(db_list, op, ii, entries) which is called after entries
+        are inserted into (op='insert') or removed from (op='pop') the list at
+        position ii, removed from the positions in the list ii (op='delete'), or
+        after the list is reversed (op='reverse'). Bound methods are held through
+        weak references.
+        '''
+        if hasattr(callback, '__self__'):
+            self._listeners.append(weakref.WeakMethod(callback))
+        else:
+            self._listeners.append(lambda: callback)
+            
+    def unsubscribe(self, callback):
         
-        json_data = self._list
-        
-        with open(path, "w") as json_file:
-            json.dump(json_data, json_file, indent=4, ensure_ascii=False)
-            json_file.write("\n")  # Add newline at the end of the last line 
-            json_file.write("\n")  # Add newline after the json data   
- 
-    def _parent_tests(self):
-        
-        assert isinstance(self._list, list) and all(isinstance(x, dict) for x in self._list), 'provide a json file which is a list of dictionaries'
-    
-        assert len(self._id_list) == len(set(self._id_list)), 'Some ids appear multiple times'
- 
-class db_experiment_list(db_list):
-    
-    '''
-    This inherits from db_list and adds insert, append, create_entry
-    functionalities. The reason why these are child dependant functions is
-    during these some checks are made to make sure the entries that you are trying
-    to add to the list have the format required by experiment datasets in our database.
-    '''
-
-    def __init__(self, json_path, name=None):  
-
-        super().__init__(json_path, name)
+        self._listeners = [x for x in self._listeners if x() is not None and x() != callback]
         
-        # these are used during writing the list to a file
-        self._cross_check_complete = False
-        self._cross_check_failed = False
-        self._cross_check_required = True
+    def _notify(self, op, ii, entries):
         
-        if self._do_tests:
-            self._test()
+        if self._replaying:
+            return
         
-    def insert(self, ii, val):
+        self._edited = True
+        self._changed(op, ii, entries)
         
-        if self._check_new_entries:
-            self._check_entry(val)
+        if self._digest_list is not None:
+            self._update_digests(op, ii, entries)
+            
+        if self._shard_list is not None:
+            self._update_shards(op, ii, entries)
         
-        self._id_list.insert(ii, val['id'])
-        self._list.insert(ii, val)
+        if self._journal is not None:
+            self._record(op, ii, entries)
         
-    def append(self, val):
+        for listener in list(self._listeners):
+            callback = listener()
+            if callback is None:
+                self._listeners.remove(listener)
+            else:
+                callback(self, op, ii, entries)
+                
+    def _changed(self, op, ii, entries):
+        '''hook for child classes which need to track their own changes'''
+        pass
         
-        self.insert(len(self._list), val)
-
-    def create_entry(self, ename, edesc, eresults, eid=None):
+    def _open_journal(self):
         
-        if eid is not None:
-            assert len(eid)==6 and all(x.isalnum() for x in eid),'entry id should be alpha numerical of length 6'
-            assert eid not in self._id_list, 'entry should not already exist in the list'
-        else:
-            eid = self.generate_new_id()
+        '''
+        replays the journal of the list if there is one and opens it for appending.
+        The first record of a journal holds the size, modification time and content
+        hash of the json file it applies to. The hash is only computed when the
+        modification time differs, so that copies of the files keep their journal.
+        The journal of a different json file is moved aside to journal_path + '.stale'
+        (or .stale1, .stale2, ...) and a new one is started, it is never overwritten.
+        '''
         
-        assert isinstance(ename,str) and len(ename)>0, 'entry name should be a non-empty string'
-        assert isinstance(edesc,str) and len(edesc)>0, 'entry description should be a non-empty string'
-        assert isinstance(eresults, list) and len(eresults) >0, 'entry results should be a non-empty list'
+        journal_path = self._json_path + '.journal'
+        stat = os.stat(self._json_path)
+        base = {'op':'base', 'size':stat.st_size, 'mtime_ns':stat.st_mtime_ns, 'hash':None}
+        records = []
         
-        entry = {}
-        entry['id'] = eid
-        entry['name'] = ename
-        entry['description'] = edesc
-        entry['results'] = eresults
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r', encoding='utf-8') as fileobj:
+                records = [json.loads(x) for x in fileobj if x.strip()]
+                
+            first = records[0] if len(records)>0 else {}
+            
+            if first.get('op') == 'base' and first.get('size') == base['size'] and first.get('mtime_ns') != base['mtime_ns']:
+                base['hash'] = _file_digest(self._json_path)
+                
+            if first.get('op') == 'base' and first.get('size') == base['size'] and \
+                    (first.get('mtime_ns') == base['mtime_ns'] or first.get('hash') == base['hash']):
+                self._edited = len(records)>1
+                self._replaying = True
+                try:
+                    for record in records[1:]:
+                        self._replay(record)
+                finally:
+                    self._replaying = False
+            else:
+                stale_path = journal_path + '.stale'
+                counter = 0
+                while os.path.exists(stale_path):
+                    counter += 1
+                    stale_path = journal_path + f'.stale{counter}'
+                    
+                os.replace(journal_path, stale_path)
+                logging.warning(f'journal {journal_path} does not belong to the current {self._json_path} and is moved to {stale_path}')
+                records = []
+            
+        self._journal = open(journal_path, 'a' if len(records)>0 else 'w', encoding='utf-8')
         
-        self.append(entry)
+        if len(records) == 0:
+            if base['hash'] is None:
+                base['hash'] = _file_digest(self._json_path)
+            self._append_record(base)
+            
+    def _replay(self, record):
         
-    def _test(self):
+        if record['op'] == 'insert':
+            if self._do_tests:
+                self._check_batch(record['entries'])
+                
+            if record['index'] == len(self._list):
+                self._extend(record['entries'])
+            else:
+                for ind, entry in enumerate(record['entries']):
+                    self._insert(record['index'] + ind, entry)
+                    
+        elif record['op'] in ('pop', 'delete'):
+            positions = [record['index']] if record['op'] == 'pop' else record['index']
+            
+            if [self._id_list[x] for x in positions] != record['ids']:
+                raise ValueError(f'journal of {self._json_path} does not match the list')
+                
+            for pos in sorted(positions, reverse=True):
+                self.pop(pos)
+                
+        elif record['op'] == 'reverse':
+            self.reverse()
+            
+    def _record(self, op, ii, entries):
         
-        for entry in self._list:
-            try:
-                self._check_result(entry)
-            except AssertionError as e:
-                raise AssertionError (f'Testing the existing data has failed with message: \n {e}')
-    
+        if op == 'insert':
+            record = {'op':op, 'index':ii, 'entries':entries}
+        elif op in ('pop', 'delete'):
+            record = {'op':op, 'index':ii, 'ids':[x['id'] for x in entries]}
+        else:
+            record = {'op':op}
+            
+        self._append_record(record)
+            
+    def _append_record(self, record):
         
-    def _check_entry(self, val):
+        self._journal.write(json.dumps(record, ensure_ascii=False, default=_json_default) + '\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
         
-        assert isinstance(val, dict), f'value to be inserted should be a dictionary but is a {type(val)}'
-        assert 'id' in val and all(x.isalnum() for x in val['id']) and len(val['id']) == 6, 'the dictionary should have an id field which is alphanumerical of length 6'
+    def compact(self):
+        '''writes the list to its json file, which also empties the journal'''
         
-        val_id = val['id']
+        assert self._json_path is not None, 'the list was not loaded from a json path'
         
-        if val_id in self._id_list:
-            raise ValueError(f'an entry with the same id {val_id} already exists in the database (entry {self._id_list.index(val_id)})')
-            
-        self._check_result(val)
-            
-    def _check_result(self, val):
+        self.write(self._json_path)
         
+    def _written(self, path):
         '''
-        this is a function which checks the results field of an experiment entry
+        once the list is written over its own json file it matches the file again
+        and a new journal is started
         '''
         
-        assert 'results' in val and len(val['results'])>0, 'experiment entry should contain a non-empty results field'
-        assert all(isinstance(x,dict) for x in val['results']), 'all entries in results should be a dictionary'
-        assert 'description' in val and len(val['description'])>0, 'experiment entry should contain description'
-        assert 'name' in val and len(val['name'])>0, 'experiment entry should contain name'
+        if self._stats is not None:
+            self._count(entries=len(self._list), bytes_written=os.path.getsize(path))
+            
+        if self._json_path is None or os.path.abspath(path) != os.path.abspath(self._json_path):
+            return
         
-        exp_name = val['name']
+        self._edited = False
         
-        for ind,result in enumerate(val['results']):
-            log_result = f'result {ind} of experiment {exp_name}'
-            
-            for key in REQUIRED_EXP_KEYS:
-                assert key in result, f'{key} does not exist in ' + log_result
-            
-            # check format of some critical fields 
-            assert isinstance(result['serum_ids'], list) and all(isinstance(x,str) for x in result['serum_ids']), 'serum_ids in ' + log_result + 's hould be a list of strings'
-            assert isinstance(result['antigen_ids'], list) and all(isinstance(x,str) for x in result['antigen_ids']), 'antigen_ids in ' + log_result + ' should be a list of strings'
-            assert isinstance(result['titers'],list) and all(isinstance(x,list) for x in result['titers']), 'Titers in ' + log_result + ' should be a list of lists'
-            assert all(isinstance(x,str) for titer in result['titers'] for x in titer), 'Titers in ' + log_result + ' should all be of string format.'
-            
-            # check consistency of titer format, and some size checks wr to
-            # number of antigens and sera
-            assert len(result['titers']) == len(result['antigen_ids']), 'titers in ' + log_result + ' should be a list with the same length as number of antigens'
-            assert all(len(x) == len(result['serum_ids']) for x in result['titers']), 'each element of titers list in ' + log_result +' should have the same length as number of sera'
-            assert all(all(all([x.isnumeric() or x in KNOWN_TITER_SYMBOLS for x in titer]) for titer in row) for row in result['titers']), 'some titers in ' + log_result + ' have unknown format'
+        if self._journal is not None:
+            self._journal.close()
+            os.remove(self._json_path + '.journal')
+            self._open_journal()
+        
+    def insert(self,ii,val):
+        raise TypeError(f'Insert is only defined for child classes of {self.__class__.__name__}')
     
-    def cross_check(self, antigen_list, serum_list):
+    def append(self, val):
+        raise TypeError(f'Append is only defined for child classes of {self.__class__.__name__}')
+
+        
+    def pop(self, ii):
+        self._assert_writable()
+        start = range(len(self._list))[ii]
+        
+        entry = self._list.pop(start)
+        self._unindex_ids(start)
+        self._id_list.pop(start)
+        self._index_ids(start)
+        self._notify('pop', start, [entry])
+        
+    def reverse(self):
+        self._assert_writable()
+        self._list.reverse()
+        self._id_list.reverse()
+        self._id_index.clear()
+        self._index_ids()
+        self._notify('reverse', 0, [])
+
+    def instrument(self, enabled=True, callback=None, trace_memory=False):
         
         '''
-        This is a bunch of tests to make sure that the experiment list is compatible
-        with a corresponding list of antigens and sera.
+        turns the recording of statistics of the operations on the list on or off.
+        For each of load, _parent_tests, _test, _check_result, cross_check,
+        generate_new_ids, write and write_shards the number of calls, the wall time,
+        the entries processed, the bytes read and written, the id generation retries
+        and the peak memory are summed up (the maximum for peak memory), see stats.
+        
+        callback(db_list, op, record) is called after each operation with its own
+        record. Peak memory is only measured with trace_memory=True since it traces
+        all allocations with tracemalloc, and only for the outermost operation when
+        operations are nested. When instrumentation is off, the only cost is a check
+        of an attribute per operation.
         '''
-        self._cross_check_failed = False
-        list_serum_ids = [x['id'] for x in serum_list]
-        list_antigen_ids = [x['id'] for x in antigen_list]
         
+        self._stats = {} if enabled else None
+        self._stats_callback = callback
+        self._trace_memory = trace_memory
+        self._measuring = []  #  records of the operations being measured, innermost last
         
-        for entry in self._list:
-            entry_name = entry['name']
-
-            
-            for ind,result in enumerate(entry['results']):
-                result_serum_ids = result['serum_ids']
-                result_antigen_ids = result['antigen_ids']
-
-                log_result = f'result {ind} of experiment {entry_name}'
-             
-                
-                # check existence and uniqueness
-                I0 = np.argwhere([x not in list_serum_ids for x in result_serum_ids]).flatten()
-                I1 = np.argwhere(np.array([list_serum_ids.count(x) for x in result_serum_ids])>1).flatten()
-                if len(I0)>0:
-                   
-                    logging.warning(f'Sera {[result_serum_ids[x] for x in I0]} of ' + log_result + ' do not exist in serum_list')
-                    self._cross_check_failed = True
-                if len(I1)>0:
-                    logging.warning(f'Sera {[result_serum_ids[x] for x in I1]} of ' + log_result + ' appear multiple times in serum_list')
-                    self._cross_check_failed = True
-                # check existence and uniqueness
-                I0 = np.argwhere([x not in list_antigen_ids for x in result_antigen_ids]).flatten()
-                I1 = np.argwhere(np.array([list_antigen_ids.count(x) for x in result_antigen_ids])>1).flatten()
-                if len(I0)>0:
-                    logging.warning(f'Antigens {[result_antigen_ids[x] for x in I0]} of ' + log_result + ' do not exist in antigen_list')
-                    self._cross_check_failed = True
-                    
-                if len(I1)>0:
-                    
-                    logging.warning(f'Antigens {[result_antigen_ids[x] for x in I1]} of ' + log_result + ' appear multiple times in antigen_list')
-                    self._cross_check_failed = True
+    def stats(self):
+        '''the statistics recorded by instrument, keyed by operation'''
         
-        self._cross_check_complete = True
+        return {op:dict(record) for op, record in (self._stats or {}).items()}
+    
+    def _start_measure(self, op):
         
-        if not self._cross_check_failed:
-            print(f'Cross check of experiment list {self.name} succesful.')
+        record = {'seconds':0.0, 'entries':0, 'bytes_read':0, 'bytes_written':0, 'id_retries':0, 'peak_memory':None}
         
-    def write(self, path):
+        tracing = None
+        if self._trace_memory and len(self._measuring) == 0:
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                
+        self._measuring.append((op, record, tracing, time.perf_counter()))
         
-        if (self._cross_check_required and self._cross_check_complete and not self._cross_check_failed or
-            not self._cross_check_required):
-               
-            json_data = self._list
+        return record
+    
+    def _stop_measure(self, record):
+        
+        op, record, tracing, start = self._measuring.pop()
+        record['seconds'] = time.perf_counter() - start
+        
+        if tracing is not None:
+            record['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+                
+        totals = self._stats.setdefault(op, {'calls':0, 'seconds':0.0, 'entries':0, 'bytes_read':0, 'bytes_written':0,
+                                             'id_retries':0, 'peak_memory':None})
+        totals['calls'] += 1
+        
+        for key in ['seconds', 'entries', 'bytes_read', 'bytes_written', 'id_retries']:
+            totals[key] += record[key]
+            
+        if record['peak_memory'] is not None:
+            totals['peak_memory'] = max(totals['peak_memory'] or 0, record['peak_memory'])
+            
+        if self._stats_callback is not None:
+            self._stats_callback(self, op, record)
+            
+    def _count(self, **counts):
+        '''adds counts to the record of the innermost operation being measured'''
+        
+        if len(self._measuring)>0:
+            record = self._measuring[-1][1]
+            for key, value in counts.items():
+                record[key] += value
+                
+    def view(self, indices_or_ids, name=None):
+        
+        '''
+        returns a read-only list of the same class which holds the entries at the
+        given positions (a slice or an iterable of positions and ids) of this list.
+        The entries are shared with this list rather than copied, the view only
+        stores their positions. Views can be cross checked and written like lists.
+        
+        The view follows additions to and reordering of this list. If an entry of
+        the view is removed from this list, the view becomes stale and using it
+        raises a ValueError.
+        '''
+        
+        if isinstance(indices_or_ids, slice):
+            positions = np.arange(len(self._list), dtype=np.int64)[indices_or_ids]
+        else:
+            positions = np.array([self._id_index[x] if isinstance(x, str) else range(len(self._list))[x] for x in indices_or_ids],
+                                 dtype=np.int64)
+            
+        parent = self
+        
+        # views of views refer to the original list directly
+        if self._view_of is not None:
+            parent = self._view_of
+            positions = self._list.positions[positions]
+            
+        view = self.__class__.__new__(self.__class__)
+        view._init_view(parent, positions, self.name if name is None else name)
+        
+        return view
     
-            with open(path, "w") as json_file:
-                json.dump(json_data, json_file, indent=4, ensure_ascii=False)
-                json_file.write("\n")  # Add newline at the end of the last line 
-                json_file.write("\n")  # Add newline after the json data   
+    def _init_view(self, parent, positions, name):
+        '''sets up the state of a view, child classes extend this with their own state'''
+        
+        self.name = name
+        self._listeners = []
+        self._replaying = False
+        self._journal = None
+        self._json_path = None
+        self._edited = False
+        self._view_of = parent
+        self._digest_list = None
+        self._chunk_hashes = []
+        self._shard_list = None
+        self._shard_key = None
+        self.instrument(False)
+        self._reserved_ids = set()
+        self._id_rng = np.random.default_rng()
+        self._check_new_entries = parent._check_new_entries
+        self._do_tests = parent._do_tests
+        self._workers = parent._workers
+        self._executor = parent._executor
+        self._load_mode = 'view'
+        self._list = _view_entries(parent, positions)
+        self._id_list = _view_ids(self._list)
+        self._id_index = _view_index(self._list)
+        
+        parent.subscribe(self._parent_changed)
+        
+    def _parent_changed(self, parent, op, ii, entries):
+        
+        self._list.update(op, ii, entries)
+        
+    def _digests(self):
+        '''the digests of the entries in the order of the list'''
+        
+        if self._view_of is not None:
+            parent_digests = self._view_of._digests()
+            return [parent_digests[x] for x in self._list.positions.tolist()]
+        
+        if self._digest_list is None:
+            self._digest_list = [_entry_digest(x) for x in self._list]
+            self._chunk_hashes = []
+            
+        return self._digest_list
+    
+    def _update_digests(self, op, ii, entries):
+        
+        if op == 'insert':
+            self._digest_list[ii:ii] = [_entry_digest(x) for x in entries]
+            first = ii
+        elif op == 'reverse':
+            self._digest_list.reverse()
+            first = 0
         else:
-            if self._cross_check_complete and self._cross_check_failed   : 
-                 raise ValueError(f'Cross check for experiment list {self.name} has failed')
-            elif not self._cross_check_complete:
-                raise ValueError(f'Cross check for experiment list {self.name} not complete')
-class db_anti_list(db_list):
+            positions = [ii] if op == 'pop' else ii
+            for pos in sorted(positions, reverse=True):
+                del self._digest_list[pos]
+            first = min(positions, default=len(self._digest_list))
+            
+        # the chunks before the first changed position keep their hashes
+        del self._chunk_hashes[first//DIGEST_CHUNK:]
+        
+    def digest(self, ii):
+        '''the canonical hash of the entry at position ii or with id ii, see root_hash'''
+        
+        return self._digests()[self._id_index[ii] if isinstance(ii, str) else ii]
+    
+    def root_hash(self, refresh=False):
+        
+        '''
+        returns a hash of the whole list which is equal for lists with equal entries
+        in the same order. Each entry is hashed by its canonical json (which does
+        not depend on the order of keys), the digests are hashed in chunks of
+        DIGEST_CHUNK and the chunk hashes into the root. Digests are kept up to date
+        when entries are added or removed and only the chunks from the first
+        changed position onwards are hashed again. In-place edits of entries are
+        not tracked, use refresh=True to hash all the entries again.
+        '''
+        
+        if refresh:
+            self._digest_list = None
+            
+        digests = self._digests()
+        chunk_hashes = self._chunk_hashes if self._view_of is None else []
+        
+        for start in range(len(chunk_hashes)*DIGEST_CHUNK, len(digests), DIGEST_CHUNK):
+            chunk_hashes.append(hashlib.sha256(''.join(digests[start:start+DIGEST_CHUNK]).encode('ascii')).hexdigest())
+            
+        return hashlib.sha256(''.join(chunk_hashes).encode('ascii')).hexdigest()
+    
+    def diff(self, other):
+        
+        '''
+        compares the list with other (a db_list, or a list of entries) by the
+        digests of their entries and returns a dictionary with the ids which are
+        'added' in other, 'removed' from it and 'modified' in it, each in the
+        order of the list they are in. Entries which are only moved are not
+        reported, compare root hashes for that.
+        '''
+        
+        if isinstance(other, db_list):
+            other_ids, other_digests = other._id_list, other._digests()
+        else:
+            other_ids, other_digests = [x['id'] for x in other], [_entry_digest(x) for x in other]
+            
+        digests = dict(zip(self._id_list, self._digests()))
+        other_digests = dict(zip(other_ids, other_digests))
+        
+        return {'added':[x for x in other_ids if x not in digests],
+                'removed':[x for x in self._id_list if x not in other_digests],
+                'modified':[x for x in self._id_list if x in other_digests and other_digests[x] != digests[x]]}
+        
+    def _assert_writable(self):
+        
+        if self._view_of is not None:
+            raise TypeError(f'Views of a {self.__class__.__name__} are read-only')
 
+    def generate_new_id(self, stop=10000):
+        '''a new id as in generate_new_ids, which is not reserved'''
+        
+        return self.generate_new_ids(1, stop, reserve=False)[0]
+    
+    @_instrumented('generate_new_ids')
+    def generate_new_ids(self, n, stop=10000, reserve=True):
+        
+        '''
+        generates n ids of ID_LENGTH characters from ID_ALPHABET which are unique
+        among themselves, the ids of the list and the ids that were handed out
+        before but have not been added yet (see release_ids). Ids are drawn in
+        batches from the random generator of the list, see seed_ids. With
+        reserve=False the ids are not reserved and may be handed out again.
+        '''
+        
+        space = len(ID_ALPHABET)**ID_LENGTH
+        used = len(self._id_index) + len(self._reserved_ids)
+        
+        if used + n > space:
+            raise RuntimeError(f'{n} new ids requested but only {space - used} ids are left')
+        if (used + n)/space > ID_SPACE_WARNING:
+            logging.warning(f'more than {ID_SPACE_WARNING:.0%} of the id space of {self.name} is in use')
+        
+        new_ids = {}
+        counter = 0
+        drawn = 0
+        powers = len(ID_ALPHABET)**np.arange(ID_LENGTH-1, -1, -1)
+        
+        while len(new_ids) < n:
+            
+            counter +=1 
+            
+            if counter>stop:
+                raise RuntimeError(f'Unique ids could not be produced after {stop} steps, check your inputs')
+            
+            codes = self._id_rng.integers(0, space, size=n - len(new_ids))
+            drawn += len(codes)
+            digits = ID_ALPHABET[(codes[:,None] // powers) % len(ID_ALPHABET)]
+            
+            for random_id in digits.view(f'<U{ID_LENGTH}').ravel().tolist():
+                if random_id not in self._id_index and random_id not in self._reserved_ids:
+                    new_ids[random_id] = None
+        
+        new_ids = list(new_ids)
+        if reserve:
+            self._reserved_ids.update(new_ids)
+        
+        if self._stats is not None:
+            self._count(entries=n, id_retries=drawn - n)
+        
+        return new_ids
+    
+    def release_ids(self, ids):
+        '''returns ids handed out by generate_new_ids which will not be used'''
+        
+        self._reserved_ids.difference_update(ids)
+    
+    def seed_ids(self, seed):
+        '''seeds the random generator used by generate_new_ids for reproducible ids'''
+        
+        self._id_rng = np.random.default_rng(seed)
+ 
+    
+ 
+    @_instrumented('write')
+    def write(self, path, compact=False):
+    
+        '''a save json function which is compatible
+        with the formatting of our datasets. This is overwritten
+        slightly in db_experiment_list for some extra functionality.
+        
+        Entries are written one by one to a temporary file which then
+        replaces path, so a failed write leaves path untouched. With
+        compact=True lists of numbers and strings, such as titer rows,
+        are kept on a single line.
+        '''
+        
+        _write_entries(self._list, path, compact)
+        self._written(path)
+ 
+    def _untested(self):
+        
+        '''
+        returns the positions of the entries which are not recorded as tested in the
+        validation cache, and the record to save with _save_tested once they pass.
+        Entries are identified by the digests of their text in the json file, or of
+        their canonical json if the list differs from its file.
+        '''
+        
+        raw_text, raw_spans = self._raw_text, self._raw_spans
+        self._raw_text = self._raw_spans = None
+        
+        if self._validation_cache is None or self._json_path is None:
+            return range(len(self._list)), None
+        
+        stat = os.stat(self._json_path)
+        record = {'kind':self.__class__.__name__, 'path':os.path.abspath(self._json_path), 'tests':_module_digest(),
+                  'size':stat.st_size, 'mtime_ns':stat.st_mtime_ns, 'file_hash':None, 'digests':None}
+        cache_path = _validation_cache_path(self._validation_cache, record)
+        cached = _read_validation_cache(cache_path)
+        
+        if self._revalidate or cached is None or cached['tests'] != record['tests']:
+            cached = {'size':None, 'mtime_ns':None, 'file_hash':None, 'digests':[]}
+            
+        if not self._edited:
+            
+            if (cached['size'], cached['mtime_ns']) == (record['size'], record['mtime_ns']):
+                os.utime(cache_path)
+                return [], None
+            
+            record['file_hash'] = _file_digest(self._json_path)
+            
+            if cached['file_hash'] == record['file_hash']:
+                _write_validation_cache(self._validation_cache, cache_path, dict(cached, size=record['size'], mtime_ns=record['mtime_ns']))
+                return [], None
+        
+        if self._edited:
+            record['digests'] = [_entry_digest(x) for x in self._list]
+        else:
+            if raw_spans is None:  #  the text is only kept while loading
+                with open(self._json_path, 'r') as fileobj:
+                    raw_text = fileobj.read()
+                raw_spans = _parse_json_array(raw_text)[1]
+                
+            record['digests'] = [hashlib.sha256(raw_text[start:end].encode('utf-8')).hexdigest()[:32] for start, end in raw_spans]
+            
+        tested = set(cached['digests'])
+        
+        return [pos for pos, digest in enumerate(record['digests']) if digest not in tested], record
+    
+    def _save_tested(self, record):
+        '''records in the validation cache that the entries of the list passed the tests'''
+        
+        if record is None:
+            return
+        
+        if self._edited:  #  the list differs from its file, only the entries are recorded
+            record = dict(record, size=None, mtime_ns=None, file_hash=None)
+        
+        _write_validation_cache(self._validation_cache, _validation_cache_path(self._validation_cache, record), record)
+    
+    @_instrumented('_parent_tests')
+    def _parent_tests(self):
+        
+        assert isinstance(self._list, list) and all(isinstance(x, dict) for x in self._list), 'provide a json file which is a list of dictionaries'
+    
+        assert len(self._id_list) == len(self._id_index), 'Some ids appear multiple times'
+ 
+class db_experiment_list(db_list):
+    
+    '''
+    This inherits from db_list and adds insert, append, create_entry
+    functionalities. The reason why these are child dependant functions is
+    during these some checks are made to make sure the entries that you are trying
+    to add to the list have the format required by experiment datasets in our database.
     '''
-    This datastructure is like for db_experiment_list
-    but is for antibodies and antigens.
-    '''    
 
-    def __init__(self, json_path, name=None):  
+    def __init__(self, json_path, name=None, intern_ids=False, **kwargs):  
+        
+        '''
+        See db_list for the arguments. If intern_ids is True, the antigen_ids and
+        serum_ids of the results are stored as interned_ids, which are integer codes
+        in the vocabulary of the list, instead of lists of strings. They read, change
+        and are written like lists of strings but are not lists, json.dumps of an
+        entry needs default=list. This requires a fully loaded or streamed list,
+        entries which are added later are interned too.
+        '''
+        
+        # integer codes of antigen and serum ids shared by the titer tables of the results,
+        # these are set before loading since snapshots fill them
+        self._vocabulary = id_vocabulary()
+        self._titer_tables = {}
+        self._intern_ids = intern_ids
 
-        super().__init__(json_path, name)
+        super().__init__(json_path, name, **kwargs)
+        
+        if intern_ids:
+            assert self._load_mode in ('full', 'stream'), 'intern_ids requires a fully loaded or streamed list'
+            
+            for entry in self._list:
+                self._intern(entry)
+        
+        # these are used during writing the list to a file
+        self._cross_check_complete = False
+        self._cross_check_failed = False
+        self._cross_check_required = True
+        
+        # these are used for incremental cross checks, see cross_check
+        self._checked_against = None
+        self._verdicts = {}
+        self._dirty = set(self._id_list)
+        
+        # antigen id, serum id or assay -> entry id -> [(result index, row or column)], built on first use
+        self._ref_index = None
+        
+        if self._do_tests and self._load_mode in ('full', 'sharded'):
+            self._test()
+        
+    def _init_view(self, parent, positions, name):
+        
+        super()._init_view(parent, positions, name)
+        
+        # parsed titers are shared with the parent, cross checks are done anew
+        self._vocabulary = parent._vocabulary
+        self._titer_tables = parent._titer_tables
+        self._intern_ids = parent._intern_ids
+        self._cross_check_complete = False
+        self._cross_check_failed = False
+        self._cross_check_required = parent._cross_check_required
+        self._checked_against = None
+        self._verdicts = {}
+        self._dirty = set(self._id_list)
+        self._ref_index = None
         
-       
     def insert(self, ii, val):
         
         if self._check_new_entries:
             self._check_entry(val)
         
-        self._id_list.insert(ii, val['id'])
-        self._list.insert(ii, val)
+        self._insert(ii, val)
         
     def append(self, val):
         
-        self.insert(len(self._list), val)   
+        self.insert(len(self._list), val)
         
-    def _check_entry(self, val):
+    def extend(self, entries):
         
-        assert isinstance(val, dict), 'value to be inserted should be a dictionary'
-        assert 'id' in val and all(x.isalnum() for x in val['id']) and len(val['id']) == 6, 'the dictionary should have an id field which is alphanumerical of length 6'
+        '''
+        appends a batch of entries. The whole batch is checked before anything is
+        added so either all the entries are added or none of them.
+        '''
         
-        val_id = val['id']
+        entries = list(entries)
         
-        if val_id in self._id_list:
-            raise ValueError(f'an entry with the same id {val_id} already exists in the database (entry {self._id_list.index(val_id)})')
+        if self._check_new_entries:
+            self._check_batch(entries)
             
-    def create_entry(self, elong, eid=None):
+        self._extend(entries)
+
+    def create_entry(self, ename, edesc, eresults, eid=None):
         
-            
-        if eid is None:
+        if eid is not None:
+            assert len(eid)==6 and all(x.isalnum() for x in eid),'entry id should be alpha numerical of length 6'
+            assert eid not in self._id_index, 'entry should not already exist in the list'
+        else:
             eid = self.generate_new_id()
         
-        if self._check_new_entries:
-            assert isinstance(elong,str) and len(elong)>0, 'entry long should be a non-empty string'
-            assert len(eid)==6 and all(x.isalnum() for x in eid),'entry id should be alpha numerical of length 6'
-            assert eid not in self._id_list, f'entry {eid} already exists in the list'
-       
+        assert isinstance(ename,str) and len(ename)>0, 'entry name should be a non-empty string'
+        assert isinstance(edesc,str) and len(edesc)>0, 'entry description should be a non-empty string'
+        assert isinstance(eresults, list) and len(eresults) >0, 'entry results should be a non-empty list'
+        
         entry = {}
         entry['id'] = eid
-        entry['long'] = elong
-       
+        entry['name'] = ename
+        entry['description'] = edesc
+        entry['results'] = eresults
         
         self.append(entry)
         
-    
\ No newline at end of file
+    def create_entries(self, enames, edescs, eresults, eids=None):
+        
+        '''
+        creates an entry for each element of enames, edescs and eresults (and eids
+        if given, otherwise ids are generated) and adds them all with extend
+        '''
+        
+        assert len(enames) == len(edescs) == len(eresults), 'enames, edescs and eresults should have the same length'
+        
+        if eids is None:
+            eids = generated = self.generate_new_ids(len(enames))
+        else:
+            generated = []
+            assert len(eids) == len(enames), 'eids should have the same length as enames'
+            assert all(len(eid)==6 and all(x.isalnum() for x in eid) for eid in eids),'entry ids should be alpha numerical of length 6'
+        
+        # the generated ids are released if the entries are not added
+        try:
+            for ename, edesc, eresult in zip(enames, edescs, eresults):
+                assert isinstance(ename,str) and len(ename)>0, 'entry names should be non-empty strings'
+                assert isinstance(edesc,str) and len(edesc)>0, 'entry descriptions should be non-empty strings'
+                assert isinstance(eresult, list) and len(eresult) >0, 'entry results should be non-empty lists'
+            
+            self.extend({'id':eid, 'name':ename, 'description':edesc, 'results':eresult}
+                        for eid, ename, edesc, eresult in zip(eids, enames, edescs, eresults))
+        except BaseException:
+            self.release_ids(generated)
+            raise
+        
+    @_instrumented('_test')
+    def _test(self):
+        
+        positions, record = self._untested()
+        entries = self._list if len(positions) == len(self._list) else [self._list[x] for x in positions]
+        
+        if self._workers is None or self._workers <= 1:
+            for entry in entries:
+                self._test_entry(entry)
+            errors = []
+        elif self._executor != 'thread' and self._json_path is not None and not self._edited:
+            # worker processes parse their own byte ranges of the file, only errors are sent back
+            offsets = _byte_index(self._json_path)[0]
+            assert len(offsets) == len(self._list), f'{self._json_path} changed while it was loaded'
+            errors = _parallel_chunks(_check_slices, [offsets[x] for x in positions], self._workers, self._executor,
+                                      self._json_path, _check_experiment_entry)
+        else:
+            errors = _parallel_chunks(_check_entries, entries, self._workers, self._executor, _check_experiment_entry)
+            
+        if len(errors)>0:
+            message = '\n '.join(f'entry {positions[pos]}: {error}' for pos, error in errors)
+            raise AssertionError (f'Testing the existing data has failed with message: \n {message}')
+            
+        self._save_tested(record)
+        
+        if self._stats is not None:
+            self._count(entries=len(positions))
+                
+    def _test_entry(self, entry):
+        
+        try:
+            self._check_result(entry)
+        except AssertionError as e:
+            raise AssertionError (f'Testing the existing data has failed with message: \n {e}')
+    
+        
+    def _check_entry(self, val):
+        
+        assert isinstance(val, dict), f'value to be inserted should be a dictionary but is a {type(val)}'
+        assert 'id' in val and all(x.isalnum() for x in val['id']) and len(val['id']) == 6, 'the dictionary should have an id field which is alphanumerical of length 6'
+        
+        val_id = val['id']
+        
+        if val_id in self._id_index:
+            raise ValueError(f'an entry with the same id {val_id} already exists in the database (entry {self._id_index[val_id]})')
+            
+        self._check_result(val)
+            
+    @_instrumented('_check_result')
+    def _check_result(self, val):
+        
+        '''
+        this is a function which checks the results field of an experiment entry
+        '''
+        _check_experiment_entry(val)
+        
+        if self._stats is not None:
+            self._count(entries=1)
+    
+    @_instrumented('cross_check')
+    def cross_check(self, antigen_list, serum_list, full=False, workers=None):
+        
+        '''
+        This is a bunch of tests to make sure that the experiment list is compatible
+        with a corresponding list of antigens and sera. The ids of the results
+        are checked in one batch against the ids of the antigen and serum lists.
+        
+        The verdict for each entry is cached. When cross_check is called again with
+        the same antigen and serum lists, only the entries which were added since
+        then or which refer to antigens or sera that were added to or removed from
+        those lists are re-checked. In-place edits of entries are not tracked, use
+        full=True to re-check everything after such edits. With workers > 1 the
+        entries to check are split across a thread pool.
+        
+        Returns a report which is a dictionary keyed by (entry id, result index) of
+        the failing results. Each value is a dictionary with the lists of missing_sera,
+        duplicated_sera, missing_antigens and duplicated_antigens of that result.
+        '''
+        
+        store = _sqlite_store_of(self, 'experiments')
+        
+        if store is not None and store is _sqlite_store_of(antigen_list, 'antigens') is _sqlite_store_of(serum_list, 'sera'):
+            if self._stats is not None:
+                self._count(entries=len(self._list))
+            return self._report(store.cross_check())
+        
+        if full or self._checked_against is None or self._checked_against[0]() is not antigen_list\
+            or self._checked_against[1]() is not serum_list:
+            
+            self._watch(antigen_list, serum_list)
+            self._verdicts = {}
+            self._dirty = set(self._id_list)
+            self._index_refs()
+        
+        entries = [self.get_by_id(x) for x in self._dirty if x in self._id_index]
+        
+        if self._stats is not None:
+            self._count(entries=len(entries))
+        
+        for eid in self._dirty:
+            self._verdicts.pop(eid, None)
+        for entry in entries:
+            self._verdicts[entry['id']] = {}
+            
+        for (eid, ind), value in self._check_ids(entries, antigen_list, serum_list, workers).items():
+            self._verdicts[eid][ind] = value
+        
+        self._dirty = set()
+        
+        failed_ids = sorted((x for x in self._verdicts if len(self._verdicts[x])>0), key=self._id_index.get)
+        
+        return self._report({(eid, ind):value for eid in failed_ids for ind, value in sorted(self._verdicts[eid].items())})
+    
+    def _report(self, failed):
+        '''logs the failing results of a cross check and sets the cross check flags'''
+        
+        report = {}
+        
+        for (eid, ind), value in failed.items():
+            entry_name = self.get_by_id(eid)['name']
+            
+            log_result = f'result {ind} of experiment {entry_name}'
+            
+            if value['missing_sera']:
+                logging.warning(f'Sera {value["missing_sera"]} of ' + log_result + ' do not exist in serum_list')
+            if value['duplicated_sera']:
+                logging.warning(f'Sera {value["duplicated_sera"]} of ' + log_result + ' appear multiple times in serum_list')
+            if value['missing_antigens']:
+                logging.warning(f'Antigens {value["missing_antigens"]} of ' + log_result + ' do not exist in antigen_list')
+            if value['duplicated_antigens']:
+                logging.warning(f'Antigens {value["duplicated_antigens"]} of ' + log_result + ' appear multiple times in antigen_list')
+                
+            report[(eid, ind)] = value
+    
+        self._cross_check_failed = len(report)>0
+        self._cross_check_complete = True
+        
+        if not self._cross_check_failed:
+            print(f'Cross check of experiment list {self.name} succesful.')
+            
+        return report
+    
+    def _check_ids(self, entries, antigen_list, serum_list, workers=None):
+        
+        '''
+        checks the ids of all the results of entries in one batch and returns the
+        report of the failing results, see cross_check
+        '''
+        
+        antigen_ids = _list_ids(antigen_list)
+        serum_ids = _list_ids(serum_list)
+        
+        if workers is None or workers <= 1:
+            return _check_result_ids(entries, 0, antigen_ids, serum_ids)
+        
+        reports = _parallel_chunks(_check_result_ids, entries, workers, 'thread', antigen_ids, serum_ids, merge=False)
+        
+        return {key:value for report in reports for key,value in report.items()}
+    
+    def titer_table(self, ii, result_index=0):
+        
+        '''
+        returns the titers of a result of the entry at position ii (or with id ii)
+        as a titer_table. Tables are parsed once and cached until the entry is
+        removed or the titers field of the result is replaced.
+        '''
+        
+        entry = self.get_by_id(ii) if isinstance(ii, str) else self._list[ii]
+        result = entry['results'][result_index]
+        key = (entry['id'], result_index)
+        
+        cached = self._titer_tables.get(key)
+        
+        if cached is None or cached[0] is not result['titers']:
+            table = titer_table.from_result(result, self._vocabulary)
+            cached = self._titer_tables[key] = (result['titers'], table)
+            
+        return cached[1]
+    
+    def titer_rows(self, assay=None, dates=None, antigen_ids=None, serum_ids=None, experiment_ids=None):
+        
+        '''
+        yields the titers of the results one by one as rows of (experiment id,
+        result index, assay, date, antigen id, serum id, titer), see TITER_ROW_FIELDS.
+        Rows can be filtered by assay (one or a set of assays), dates (a (first, last)
+        pair of dates in the format of the results, inclusive, either can be None) and
+        sets of antigen_ids, serum_ids and experiment_ids. Only one entry is held at a
+        time, entries of lazily loaded lists are read without being cached.
+        '''
+        
+        assays = {assay} if isinstance(assay, str) else assay
+        first, last = (None, None) if dates is None else dates
+        
+        for pos in range(len(self._list)):
+            
+            entry = self._list.peek(pos) if isinstance(self._list, _lazy_entries) else self._list[pos]
+            
+            if experiment_ids is not None and entry['id'] not in experiment_ids:
+                continue
+            
+            for ind, result in enumerate(entry['results']):
+                
+                date = result.get('date')
+                
+                if (assays is not None and result.get('assay') not in assays or
+                    first is not None and (date is None or date < first) or
+                    last is not None and (date is None or date > last)):
+                    continue
+                
+                rows = [(row, x) for row, x in enumerate(result['antigen_ids']) if antigen_ids is None or x in antigen_ids]
+                cols = [(col, x) for col, x in enumerate(result['serum_ids']) if serum_ids is None or x in serum_ids]
+                
+                for row, antigen_id in rows:
+                    titers = result['titers'][row]
+                    for col, serum_id in cols:
+                        yield (entry['id'], ind, result.get('assay'), date, antigen_id, serum_id, titers[col])
+                        
+    def write_titers_csv(self, path, chunk_size=10000, **filters):
+        
+        '''
+        writes the rows of titer_rows (with the given filters) to a csv file with a
+        header of TITER_ROW_FIELDS, chunk_size rows at a time. Like write, the file
+        is written to a temporary file which then replaces path.
+        '''
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+        
+        try:
+            with os.fdopen(fd, 'w', newline='', encoding='utf-8') as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(TITER_ROW_FIELDS)
+                
+                rows = self.titer_rows(**filters)
+                
+                for chunk in iter(lambda: list(itertools.islice(rows, chunk_size)), []):
+                    writer.writerows(chunk)
+                    
+            os.replace(tmp_path, path)
+            
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+    def titer_records(self, **filters):
+        
+        '''
+        returns the rows of titer_rows (with the given filters) as a numpy structured
+        array with the fields of TITER_ROW_DTYPE. A first pass over the rows widens
+        the string fields to their longest value so that none is truncated, the
+        array is filled in a second pass. Missing assays and dates are ''.
+        '''
+        
+        strings = [ind for ind, name in enumerate(TITER_ROW_FIELDS) if TITER_ROW_DTYPE[name].kind == 'U']
+        widths = {ind:TITER_ROW_DTYPE[TITER_ROW_FIELDS[ind]].itemsize//4 for ind in strings}
+        
+        def rows():
+            for row in self.titer_rows(**filters):
+                yield tuple('' if x is None else x for x in row)
+        
+        for row in rows():
+            for ind in strings:
+                if len(row[ind]) > widths[ind]:
+                    widths[ind] = len(row[ind])
+                    
+        dtype = np.dtype([(name, f'U{widths[ind]}' if ind in widths else TITER_ROW_DTYPE[name]) for ind, name in enumerate(TITER_ROW_FIELDS)])
+        
+        return np.fromiter(rows(), dtype=dtype)
+    
+    def titer_matrix(self, policy='all', assay=None, sparse=True, memory_budget=None):
+        
+        '''
+        merges the titers of all results (with the given assay if assay is not None)
+        into one antigen x serum titer_matrix, see titer_matrix for the format.
+        Repeated measurements of an antigen serum pair are merged with policy:
+        
+        'all': all repeats are kept
+        'latest': the titer of the result with the latest date is kept, results
+                  without a date are the oldest and ties go to the later result
+        'geomean': the geometric mean of the numeric titers (including ones like
+                   40/80) is kept, pairs with one numeric titer keep it and pairs
+                   without numeric titers keep the latest
+        
+        Empty titers are left out. memory_budget (in bytes) caps the estimated peak
+        size of all the arrays built along the way, and of the dense matrix if sparse
+        is False, a MemoryError is raised before building them if they would not
+        fit. The titer tables are parsed for the call only and are not cached.
+        '''
+        
+        assert policy in ('all', 'latest', 'geomean'), "policy should be one of 'all', 'latest' or 'geomean'"
+        
+        results = self.results_with(assay=assay)
+        shapes = [(len(x['antigen_ids']), len(x['serum_ids'])) for x in (self.get_by_id(eid)['results'][ind] for eid, ind in results)]
+        
+        # bytes per cell at most held at once: the parsed tables (float64 value and int8
+        # qualifier), the merged and then the filtered int32 row, column and source,
+        # float64 value and int8 qualifier (21 each), the int64 inverses of np.unique and
+        # the int64 order of np.lexsort. Parsing a table also holds its titers as a numpy
+        # string array and the int64 inverse of np.unique, about 80 bytes per cell.
+        cells = [x*y for x,y in shapes]
+        required = sum(cells) * (9 + 21 + 21 + 2*8 + 8) + max(cells, default=0) * 80
+        
+        if memory_budget is not None and required > memory_budget:
+            raise MemoryError(f'merging {len(results)} results requires about {required} bytes which exceeds the memory budget of {memory_budget}')
+        
+        # tables are parsed without being cached so that nothing is left behind
+        tables = []
+        for eid, ind in results:
+            result = self.get_by_id(eid)['results'][ind]
+            cached = self._titer_tables.get((eid, ind))
+            tables.append(cached[1] if cached is not None and cached[0] is result['titers'] else titer_table.from_result(result, self._vocabulary))
+        
+        row_codes = np.concatenate([np.repeat(x.antigen_index, x.shape[1]) for x in tables] + [np.zeros(0, dtype=np.int32)])
+        col_codes = np.concatenate([np.tile(x.serum_index, x.shape[0]) for x in tables] + [np.zeros(0, dtype=np.int32)])
+        values = np.concatenate([x.values.ravel() for x in tables] + [np.zeros(0)])
+        qualifiers = np.concatenate([x.qualifiers.ravel() for x in tables] + [np.zeros(0, dtype=np.int8)])
+        sources = np.repeat(np.arange(len(tables), dtype=np.int32), [x.values.size for x in tables])
+        del tables
+        
+        kept = qualifiers != TITER_QUALIFIERS.index('missing')
+        row_codes, col_codes, values, qualifiers, sources = row_codes[kept], col_codes[kept], values[kept], qualifiers[kept], sources[kept]
+        
+        antigen_codes, rows = np.unique(row_codes, return_inverse=True)
+        serum_codes, cols = np.unique(col_codes, return_inverse=True)
+        rows, cols = rows.astype(np.int32).ravel(), cols.astype(np.int32).ravel()
+        
+        if not sparse and memory_budget is not None and len(antigen_codes)*len(serum_codes)*9 + required > memory_budget:
+            raise MemoryError(f'a dense {len(antigen_codes)}x{len(serum_codes)} titer matrix exceeds the memory budget of {memory_budget}')
+        
+        # rank of each source by date, the later result wins ties
+        dates = [self.get_by_id(eid)['results'][ind].get('date') or '' for eid, ind in results]
+        rank = np.empty(len(results), dtype=np.int64)
+        rank[sorted(range(len(results)), key=lambda x: (dates[x], x))] = np.arange(len(results))
+        
+        order = np.lexsort((rank[sources], cols, rows))
+        rows, cols, values, qualifiers, sources = rows[order], cols[order], values[order], qualifiers[order], sources[order]
+        
+        if policy != 'all':
+            
+            last = np.ones(len(rows), dtype=bool)
+            last[:-1] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            
+            if policy == 'geomean':
+                group = np.cumsum(np.concatenate([[True], last[:-1]])) - 1
+                numeric = np.isin(qualifiers, [TITER_QUALIFIERS.index(''), TITER_QUALIFIERS.index('/')])
+                counts = np.bincount(group[numeric], minlength=last.sum())
+                sums = np.bincount(group[numeric], weights=values[numeric], minlength=last.sum())
+                
+                # the cell of the last numeric titer of each pair, which is kept as it is if it is the only one
+                last_numeric = np.full(last.sum(), -1)
+                np.maximum.at(last_numeric, group[numeric], np.flatnonzero(numeric))
+                single = last_numeric[counts == 1]
+                single_cells = values[single], qualifiers[single], sources[single]
+                
+            rows, cols, values, qualifiers, sources = rows[last], cols[last], values[last], qualifiers[last], sources[last]
+            
+            if policy == 'geomean':
+                merged = counts>1
+                values[merged] = sums[merged]/counts[merged]
+                qualifiers[merged] = TITER_QUALIFIERS.index('')
+                sources[merged] = -1
+                values[counts == 1], qualifiers[counts == 1], sources[counts == 1] = single_cells
+                
+        matrix = titer_matrix(rows, cols, values, qualifiers, sources, antigen_codes.astype(np.int32),
+                              serum_codes.astype(np.int32), self._vocabulary, results)
+        
+        return matrix if sparse else matrix.to_dense()
+    
+    def _snapshot_data(self):
+        
+        '''
+        the titers, antigen_ids and serum_ids of all the results as contiguous arrays,
+        see titer_table. The *_offsets arrays delimit the results of each entry and
+        the ids and titer cells of each result. The overrides of the titer tables
+        are stored in meta.json keyed by result number.
+        '''
+        
+        tables = [titer_table.from_result(result, self._vocabulary) for entry in self._list for result in entry['results']]
+        
+        overrides = {str(ind):[[row, col, raw] for (row, col), raw in table.overrides.items()]
+                     for ind, table in enumerate(tables) if len(table.overrides)>0}
+        
+        arrays = {'vocabulary':np.array(self._vocabulary.decode(range(len(self._vocabulary))), dtype=str),
+                'result_offsets':np.cumsum([0] + [len(x['results']) for x in self._list], dtype=np.int64),
+                'antigen_offsets':np.cumsum([0] + [len(x.antigen_index) for x in tables], dtype=np.int64),
+                'serum_offsets':np.cumsum([0] + [len(x.serum_index) for x in tables], dtype=np.int64),
+                'cell_offsets':np.cumsum([0] + [x.values.size for x in tables], dtype=np.int64),
+                'antigen_codes':np.concatenate([x.antigen_index for x in tables] + [np.zeros(0, dtype=np.int32)]),
+                'serum_codes':np.concatenate([x.serum_index for x in tables] + [np.zeros(0, dtype=np.int32)]),
+                'values':np.concatenate([x.values.ravel() for x in tables] + [np.zeros(0)]),
+                'qualifiers':np.concatenate([x.qualifiers.ravel() for x in tables] + [np.zeros(0, dtype=np.int8)])}
+        
+        return arrays, {'overrides':overrides}
+    
+    def _snapshot_stub(self, entry):
+        
+        return _experiment_stub(entry)
+    
+    def _snapshot_opened(self, arrays, meta):
+        
+        # the codes in the snapshot are the positions in its vocabulary
+        self._vocabulary.encode(arrays['vocabulary'].tolist())
+        
+    def _snapshot_entry(self, arrays, meta, pos, cache=True):
+        
+        entry = super()._snapshot_entry(arrays, meta, pos, cache)
+        
+        first_result = arrays['result_offsets'][pos]
+        
+        for ind, result in enumerate(entry['results']):
+            
+            number = first_result + ind
+            antigen_start, antigen_end = arrays['antigen_offsets'][number:number+2]
+            serum_start, serum_end = arrays['serum_offsets'][number:number+2]
+            cell_start, cell_end = arrays['cell_offsets'][number:number+2]
+            shape = (antigen_end - antigen_start, serum_end - serum_start)
+            
+            table = titer_table(arrays['values'][cell_start:cell_end].reshape(shape),
+                                arrays['qualifiers'][cell_start:cell_end].reshape(shape),
+                                arrays['antigen_codes'][antigen_start:antigen_end],
+                                arrays['serum_codes'][serum_start:serum_end], self._vocabulary,
+                                {(row, col):raw for row, col, raw in meta['overrides'].get(str(number), [])})
+            
+            for key, value in [('antigen_ids', table.antigen_ids), ('serum_ids', table.serum_ids), ('titers', table.to_list())]:
+                if key in result:
+                    result[key] = value
+                    
+            if cache:
+                self._titer_tables[(entry['id'], ind)] = (result['titers'], table)
+            
+        return entry
+    
+    
+    def _watch(self, antigen_list, serum_list):
+        '''subscribes to changes in the antigen and serum lists used for cross checks'''
+        
+        if self._checked_against is not None:
+            for old_list in self._checked_against:
+                if isinstance(old_list(), db_list):
+                    old_list().unsubscribe(self._dependency_changed)
+        
+        for new_list in (antigen_list, serum_list):
+            if isinstance(new_list, db_list):
+                new_list.subscribe(self._dependency_changed)
+                
+        # plain lists can not be watched so a later check against them is always full
+        self._checked_against = tuple(weakref.ref(x) if isinstance(x, db_list) else (lambda: None)
+                                      for x in (antigen_list, serum_list))
+        
+    def _index_refs(self):
+        '''builds the inverted index of the antigen ids, serum ids and assays of all results'''
+        
+        self._ref_index = {'antigen_ids':collections.defaultdict(dict), 'serum_ids':collections.defaultdict(dict),
+                           'assay':collections.defaultdict(dict)}
+        
+        for entry in self._list:
+            self._add_refs(entry)
+            
+    def _add_refs(self, entry):
+        
+        for ind, result in enumerate(entry['results']):
+            for key in ['antigen_ids', 'serum_ids']:
+                for pos, x in enumerate(result[key]):
+                    self._ref_index[key][x].setdefault(entry['id'], []).append((ind, pos))
+                    
+            self._ref_index['assay'][result.get('assay')].setdefault(entry['id'], []).append((ind, None))
+                    
+    def _remove_refs(self, entry):
+        
+        for result in entry['results']:
+            for key, values in [('antigen_ids', result['antigen_ids']), ('serum_ids', result['serum_ids']), ('assay', [result.get('assay')])]:
+                for x in values:
+                    refs = self._ref_index[key].get(x)
+                    if refs is not None:
+                        refs.pop(entry['id'], None)
+                        if len(refs) == 0:
+                            del self._ref_index[key][x]
+                            
+    def titers_for(self, antigen_id=None, serum_id=None):
+        
+        '''
+        returns the titers of antigen_id against serum_id, or against all sera
+        if serum_id is None (and likewise for all antigens), across all results.
+        The values are (entry id, result index, antigen id, serum id, titer)
+        tuples in the order of the list. An inverted index of the ids of the
+        results is built on first use and kept up to date when entries are
+        added or removed. In-place edits of the ids of results are not tracked,
+        call cross_check with full=True or reload the list after such edits.
+        '''
+        
+        assert antigen_id is not None or serum_id is not None, 'provide an antigen_id or a serum_id'
+        
+        if self._ref_index is None:
+            self._index_refs()
+            
+        antigen_refs = self._ref_index['antigen_ids'].get(antigen_id, {}) if antigen_id is not None else None
+        serum_refs = self._ref_index['serum_ids'].get(serum_id, {}) if serum_id is not None else None
+        
+        if antigen_refs is not None and serum_refs is not None:
+            eids = [x for x in antigen_refs if x in serum_refs]
+        else:
+            eids = list(antigen_refs if antigen_refs is not None else serum_refs)
+            
+        titers = []
+        
+        for eid in sorted(eids, key=self._id_index.get):
+            results = self.get_by_id(eid)['results']
+            
+            rows = {}
+            cols = {}
+            
+            for ind, row in (antigen_refs[eid] if antigen_refs is not None else []):
+                rows.setdefault(ind, []).append(row)
+            for ind, col in (serum_refs[eid] if serum_refs is not None else []):
+                cols.setdefault(ind, []).append(col)
+                
+            for ind in sorted(rows.keys() | cols.keys()):
+                result = results[ind]
+                
+                result_rows = rows.get(ind, []) if antigen_refs is not None else range(len(result['antigen_ids']))
+                result_cols = cols.get(ind, []) if serum_refs is not None else range(len(result['serum_ids']))
+                
+                for row in result_rows:
+                    for col in result_cols:
+                        titers.append((eid, ind, result['antigen_ids'][row], result['serum_ids'][col], result['titers'][row][col]))
+                        
+        return titers
+    
+    def results_with(self, antigen_ids=None, serum_ids=None, assay=None):
+        
+        '''
+        returns (entry id, result index) of the results which contain all of
+        antigen_ids and serum_ids and whose assay is assay, in the order of the
+        list. Arguments which are None are not filtered on. Uses the same index
+        as titers_for.
+        '''
+        
+        if self._ref_index is None:
+            self._index_refs()
+            
+        matches = None
+        
+        for key, values in [('antigen_ids', antigen_ids), ('serum_ids', serum_ids), ('assay', None if assay is None else [assay])]:
+            for x in values or []:
+                found = {(eid, ind) for eid, refs in self._ref_index[key].get(x, {}).items() for ind, _ in refs}
+                matches = found if matches is None else matches & found
+                
+        if matches is None:
+            matches = {(entry['id'], ind) for entry in self._list for ind in range(len(entry['results']))}
+            
+        return sorted(matches, key=lambda x: (self._id_index[x[0]], x[1]))
+    
+    def _intern(self, entry):
+        '''
+        replaces the results of entry with shallow copies in which antigen_ids and
+        serum_ids are interned_ids, the result dictionaries given by the caller are
+        left as they are. The entry itself is held by the list, as in all lists.
+        '''
+        
+        results = []
+        
+        for result in entry['results']:
+            result = result.copy()
+            
+            for key in ['antigen_ids', 'serum_ids']:
+                ids = result.get(key)
+                
+                if isinstance(ids, list) or isinstance(ids, interned_ids) and ids.vocabulary is not self._vocabulary:
+                    result[key] = interned_ids(self._vocabulary.encode(ids), self._vocabulary)
+                    
+            results.append(result)
+            
+        entry['results'] = results
+                    
+    def _changed(self, op, ii, entries):
+        
+        if len(entries) == 0:
+            return
+        
+        if op == 'insert' and self._intern_ids:
+            for entry in entries:
+                self._intern(entry)
+        
+        self._cross_check_complete = False
+        
+        for entry in entries:
+            for ind in range(len(entry['results'])):
+                self._titer_tables.pop((entry['id'], ind), None)
+                
+        for entry in entries:
+            if op == 'insert':
+                self._dirty.add(entry['id'])
+                if self._ref_index is not None:
+                    self._add_refs(entry)
+            else:
+                self._dirty.discard(entry['id'])
+                self._verdicts.pop(entry['id'], None)
+                if self._ref_index is not None:
+                    self._remove_refs(entry)
+                    
+    def _dependency_changed(self, changed_list, op, ii, entries):
+        '''marks the entries which refer to added or removed antigens or sera as dirty'''
+        
+        if len(entries) == 0:
+            return
+        
+        self._cross_check_complete = False
+        
+        key = 'antigen_ids' if changed_list is self._checked_against[0]() else 'serum_ids'
+        
+        for entry in entries:
+            self._dirty.update(self._ref_index[key].get(entry['id'], ()))
+        
+    @_instrumented('write')
+    def write(self, path, compact=False):
+        
+        self._assert_can_write()
+        
+        _write_entries(self._list, path, compact)
+        self._written(path)
+            
+    def _assert_can_write(self):
+        
+        if (self._cross_check_required and self._cross_check_complete and not self._cross_check_failed or
+            not self._cross_check_required):
+            return
+        
+        if self._cross_check_complete and self._cross_check_failed   : 
+             raise ValueError(f'Cross check for experiment list {self.name} has failed')
+        elif not self._cross_check_complete:
+            raise ValueError(f'Cross check for experiment list {self.name} not complete')
+
+class db_anti_list(db_list):
+
+    '''
+    This datastructure is like for db_experiment_list
+    but is for antibodies and antigens.
+    '''    
+
+    def __init__(self, json_path, name=None, **kwargs):  
+
+        self._field_indexes = {}  #  key path -> value -> ids of the entries with that value, see filter
+        
+        super().__init__(json_path, name, **kwargs)
+        
+    def _init_view(self, parent, positions, name):
+        
+        super()._init_view(parent, positions, name)
+        
+        self._field_indexes = {}
+        
+       
+    def insert(self, ii, val):
+        
+        if self._check_new_entries:
+            self._check_entry(val)
+        
+        self._insert(ii, val)
+        
+    def append(self, val):
+        
+        self.insert(len(self._list), val)   
+        
+    def extend(self, entries):
+        
+        '''
+        appends a batch of entries. The whole batch is checked before anything is
+        added so either all the entries are added or none of them.
+        '''
+        
+        entries = list(entries)
+        
+        if self._check_new_entries:
+            self._check_batch(entries)
+            
+        self._extend(entries)
+        
+    def _check_entry(self, val):
+        
+        assert isinstance(val, dict), 'value to be inserted should be a dictionary'
+        assert 'id' in val and all(x.isalnum() for x in val['id']) and len(val['id']) == 6, 'the dictionary should have an id field which is alphanumerical of length 6'
+        
+        val_id = val['id']
+        
+        if val_id in self._id_index:
+            raise ValueError(f'an entry with the same id {val_id} already exists in the database (entry {self._id_index[val_id]})')
+            
+    def create_entry(self, elong, eid=None):
+        
+            
+        if eid is None:
+            eid = self.generate_new_id()
+        
+        if self._check_new_entries:
+            assert isinstance(elong,str) and len(elong)>0, 'entry long should be a non-empty string'
+            assert len(eid)==6 and all(x.isalnum() for x in eid),'entry id should be alpha numerical of length 6'
+            assert eid not in self._id_index, f'entry {eid} already exists in the list'
+       
+        entry = {}
+        entry['id'] = eid
+        entry['long'] = elong
+       
+        
+        self.append(entry)
+        
+    def create_entries(self, elongs, eids=None):
+        
+        '''
+        creates an entry for each element of elongs (with the corresponding eids if
+        given, otherwise ids are generated) and adds them all with extend
+        '''
+        
+        generated = []
+        if eids is None:
+            eids = generated = self.generate_new_ids(len(elongs))
+        
+        # the generated ids are released if the entries are not added
+        try:
+            if self._check_new_entries:
+                assert len(eids) == len(elongs), 'eids should have the same length as elongs'
+                assert all(isinstance(elong,str) and len(elong)>0 for elong in elongs), 'entry longs should be non-empty strings'
+                assert all(len(eid)==6 and all(x.isalnum() for x in eid) for eid in eids),'entry ids should be alpha numerical of length 6'
+                
+            self.extend({'id':eid, 'long':elong} for eid, elong in zip(eids, elongs))
+        except BaseException:
+            self.release_ids(generated)
+            raise
+        
+    def index_field(self, path):
+        
+        '''
+        builds (or rebuilds) the index of the field at the dot separated key path,
+        such as 'passage.history'. Each element of a list valued field is indexed
+        separately. Indexes are built on demand by filter and kept up to date when
+        entries are added or removed, call this again after editing entries in place.
+        '''
+        
+        index = collections.defaultdict(set)
+        
+        for entry in self._list:
+            for value in _field_values(entry, path):
+                index[value].add(entry['id'])
+                
+        self._field_indexes[path] = index
+        
+    def filter(self, query):
+        
+        '''
+        returns the set of ids of the entries which match query. A query is a
+        dictionary of key paths and values, such as
+        
+            {'groups':'clade 1', 'wildtype':False, 'passage.history':'SIAT'}
+        
+        which matches the entries for which all the fields have the given value,
+        or contain it for list valued fields. A set of values matches any of them.
+        Queries can be combined with ('and', query1, query2, ...) and
+        ('or', query1, query2, ...). Views use the indexes of their list.
+        '''
+        
+        if self._view_of is not None:
+            return self._view_of.filter(query) & set(self._id_list)
+        
+        if isinstance(query, tuple):
+            assert len(query)>1 and query[0] in ('and', 'or'), "combined queries should be of the form ('and'|'or', query1, ...)"
+            
+            matches = [self.filter(x) for x in query[1:]]
+            
+            return set.intersection(*matches) if query[0] == 'and' else set.union(*matches)
+        
+        assert isinstance(query, dict) and len(query)>0, 'query should be a non-empty dictionary or a combination of queries'
+        
+        matches = None
+        
+        for path, values in query.items():
+            
+            if path not in self._field_indexes:
+                self.index_field(path)
+                
+            index = self._field_indexes[path]
+            values = values if isinstance(values, (set, frozenset)) else [values]
+            
+            found = set().union(*(index.get(_hashable(x), ()) for x in values))
+            matches = found if matches is None else matches & found
+            
+        return matches
+    
+    def _changed(self, op, ii, entries):
+        
+        for path, index in self._field_indexes.items():
+            for entry in entries:
+                for value in _field_values(entry, path):
+                    if op == 'insert':
+                        index[value].add(entry['id'])
+                    else:
+                        index[value].discard(entry['id'])
+                        if len(index[value]) == 0:
+                            del index[value]
+
+
+class sqlite_store():
+    
+    '''
+    A sqlite database which holds the antigens, sera and experiments tables. The
+    antigen_ids, serum_ids and titers of experiment results are stored in their
+    own tables so that they can be queried and cross checked with joins, the rest
+    of each entry is stored as json. The position of each entry in its list is
+    kept in the pos column and entries are read by their key, which does not
+    change when other entries are added or removed. The versions table counts
+    the changes of each table, writes which give the version they expect are
+    refused if the table has been changed since. Lists are opened on a table
+    with db_list.from_sqlite and json files are moved in and out with
+    import_json and export_json.
+    '''
+    
+    TABLES = ('antigens', 'sera', 'experiments')
+    
+    def __init__(self, db_path):
+        
+        self.db_path = db_path
+        self._connection = sqlite3.connect(db_path)
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.executescript(SQLITE_SCHEMA)
+        
+        with self._connection:
+            self._connection.executemany('INSERT OR IGNORE INTO versions VALUES (?, 0)', [(x,) for x in self.TABLES])
+        
+    def close(self):
+        self._connection.close()
+        
+    def _table(self, table):
+        
+        assert table in self.TABLES, f'table should be one of {self.TABLES}'
+        return table
+    
+    def count(self, table):
+        return self._connection.execute(f'SELECT COUNT(*) FROM {self._table(table)}').fetchone()[0]
+    
+    def ids(self, table):
+        '''ids of the entries of table in the order of the list'''
+        return [x[0] for x in self._connection.execute(f'SELECT id FROM {self._table(table)} ORDER BY pos')]
+    
+    def rows(self, table):
+        '''(version, keys, ids) of table with the keys and ids in the order of the list, read in one transaction'''
+        
+        with self._connection:
+            self._connection.execute('BEGIN')
+            version = self.version(table)
+            rows = self._connection.execute(f'SELECT key, id FROM {self._table(table)} ORDER BY pos').fetchall()
+            
+        return version, [x[0] for x in rows], [x[1] for x in rows]
+    
+    def version(self, table):
+        return self._connection.execute('SELECT version FROM versions WHERE name = ?', (self._table(table),)).fetchone()[0]
+    
+    def _bump(self, table, version):
+        '''counts a change of table, raises a RuntimeError if its version is not version (unless that is None)'''
+        
+        if version is None:
+            self._connection.execute('UPDATE versions SET version = version + 1 WHERE name = ?', (table,))
+        elif self._connection.execute('UPDATE versions SET version = version + 1 WHERE name = ? AND version = ?', (table, version)).rowcount == 0:
+            raise RuntimeError(f'{table} of {self.db_path} has been changed by another list since this one was opened, open it again')
+    
+    def get(self, table, key):
+        
+        row = self._connection.execute(f'SELECT data FROM {self._table(table)} WHERE key = ?', (key,)).fetchone()
+        
+        if row is None:
+            raise KeyError(f'{table} has no entry with key {key}')
+        
+        entry = json.loads(row[0])
+        
+        if table == 'experiments':
+            self._fill_results(key, entry)
+            
+        return entry
+    
+    def _fill_results(self, key, entry):
+        '''puts the antigen_ids, serum_ids and titers of an experiment back in place of their placeholders'''
+        
+        query = self._connection.execute
+        
+        for ind, result in enumerate(entry['results']):
+            
+            titer_rows = query('SELECT titer_rows FROM results WHERE experiment_key = ? AND result_index = ?', (key, ind)).fetchone()[0]
+            titers = [[] for _ in range(titer_rows)]
+            
+            for row, titer in query('SELECT row, titer FROM titers WHERE experiment_key = ? AND result_index = ? ORDER BY row, col', (key, ind)):
+                titers[row].append(titer)
+                
+            values = {'antigen_ids':[x[0] for x in query('SELECT antigen_id FROM result_antigens WHERE experiment_key = ? AND result_index = ? ORDER BY row', (key, ind))],
+                      'serum_ids':[x[0] for x in query('SELECT serum_id FROM result_sera WHERE experiment_key = ? AND result_index = ? ORDER BY col', (key, ind))],
+                      'titers':titers}
+            
+            for field in values:
+                if field in result:
+                    result[field] = values[field]
+        
+    def insert(self, table, pos, entries, version=None):
+        '''inserts entries at position pos of table in a single transaction and returns their keys'''
+        
+        entries = list(entries)
+        
+        with self._connection:
+            self._bump(self._table(table), version)
+            self._connection.execute(f'UPDATE {table} SET pos = pos + ? WHERE pos >= ?', (len(entries), pos))
+            
+            return [self._add(table, pos + offset, entry) for offset, entry in enumerate(entries)]
+                
+    def _add(self, table, pos, entry):
+        
+        execute = self._connection.execute
+        
+        if table != 'experiments':
+            return execute(f'INSERT INTO {table} (id, pos, data) VALUES (?, ?, ?)',
+                           (entry['id'], pos, json.dumps(entry, ensure_ascii=False, default=_json_default))).lastrowid
+        
+        key = execute('INSERT INTO experiments (id, pos, data) VALUES (?, ?, ?)',
+                      (entry['id'], pos, json.dumps(_experiment_stub(entry), ensure_ascii=False))).lastrowid
+        
+        for ind, result in enumerate(entry['results']):
+            titers = result.get('titers', [])
+            
+            execute('INSERT INTO results VALUES (?, ?, ?, ?, ?)', (key, ind, result.get('assay'), result.get('date'), len(titers)))
+            self._connection.executemany('INSERT INTO result_antigens VALUES (?, ?, ?, ?)',
+                                         [(key, ind, row, x) for row, x in enumerate(result.get('antigen_ids', []))])
+            self._connection.executemany('INSERT INTO result_sera VALUES (?, ?, ?, ?)',
+                                         [(key, ind, col, x) for col, x in enumerate(result.get('serum_ids', []))])
+            self._connection.executemany('INSERT INTO titers VALUES (?, ?, ?, ?, ?)',
+                                         [(key, ind, row, col, x) for row, titer_row in enumerate(titers) for col, x in enumerate(titer_row)])
+        
+        return key
+        
+    def delete(self, table, start, stop=None, version=None):
+        '''deletes the entries at positions start to stop (only start if stop is None) of table'''
+        
+        stop = start + 1 if stop is None else stop
+        
+        with self._connection:
+            self._bump(self._table(table), version)
+            self._connection.execute(f'DELETE FROM {table} WHERE pos >= ? AND pos < ?', (start, stop))
+            self._connection.execute(f'UPDATE {table} SET pos = pos - ? WHERE pos >= ?', (stop - start, stop))
+            
+    def replace(self, table, pos, entry, version=None):
+        '''replaces the entry at position pos of table and returns the key of the new one'''
+        
+        with self._connection:
+            self._bump(self._table(table), version)
+            self._connection.execute(f'DELETE FROM {table} WHERE pos = ?', (pos,))
+            return self._add(table, pos, entry)
+            
+    def reverse(self, table, version=None):
+        
+        with self._connection:
+            self._bump(self._table(table), version)
+            self._connection.execute(f'UPDATE {table} SET pos = (SELECT COUNT(*) FROM {table}) - 1 - pos')
+            
+    def import_json(self, table, json_path):
+        '''
+        appends the entries of the json file at json_path to table. The file is
+        streamed so only one entry is in memory at a time and the entries are
+        added in a single transaction.
+        '''
+        
+        with self._connection, open(json_path, 'r') as fileobj:
+            self._bump(self._table(table), None)
+            pos = self.count(table)
+            
+            for pos, entry in enumerate(_iter_json_array(fileobj), pos):
+                self._add(table, pos, entry)
+                
+    def entries(self, table):
+        '''iterates over the entries of table in the order of the list'''
+        
+        for key in [x[0] for x in self._connection.execute(f'SELECT key FROM {self._table(table)} ORDER BY pos')]:
+            yield self.get(table, key)
+            
+    def export_json(self, table, path, compact=False):
+        '''writes table to a json file in the same format as db_list.write'''
+        
+        _write_entries(self.entries(table), path, compact)
+        
+    def cross_check(self):
+        '''
+        checks the antigen_ids and serum_ids of all experiment results against the
+        antigens and sera tables with joins. Returns a dictionary keyed by
+        (experiment id, result index) of the failing results in the format of
+        db_experiment_list.cross_check.
+        '''
+        
+        failed = {}
+        
+        for table, ids_table, id_column, order, key in [('sera', 'result_sera', 'serum_id', 'col', 'sera'),
+                                                         ('antigens', 'result_antigens', 'antigen_id', 'row', 'antigens')]:
+            
+            missing = f'''SELECT e.pos, e.id, r.result_index, r.{id_column} FROM {ids_table} r JOIN experiments e ON e.key = r.experiment_key
+                          WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.id = r.{id_column}) ORDER BY e.pos, r.result_index, r.{order}'''
+            duplicated = f'''SELECT e.pos, e.id, r.result_index, r.{id_column} FROM {ids_table} r JOIN experiments e ON e.key = r.experiment_key
+                             WHERE r.{id_column} IN (SELECT id FROM {table} GROUP BY id HAVING COUNT(*) > 1) ORDER BY e.pos, r.result_index, r.{order}'''
+            
+            for kind, query in [('missing', missing), ('duplicated', duplicated)]:
+                for pos, eid, ind, xid in self._connection.execute(query):
+                    value = failed.setdefault((pos, eid, ind), {'missing_sera':[], 'duplicated_sera':[], 'missing_antigens':[], 'duplicated_antigens':[]})
+                    value[f'{kind}_{key}'].append(xid)
+                    
+        return {(eid, ind):failed[(pos, eid, ind)] for pos, eid, ind in sorted(failed)}
+    
+    
+class id_vocabulary():
+    
+    '''
+    Interned ids and their integer codes. Codes are assigned in the order ids
+    are first seen and never change.
+    '''
+    
+    def __init__(self):
+        
+        self._ids = []
+        self._codes = {}
+        
+    def __len__(self):
+        return len(self._ids)
+    
+    def __getitem__(self, code):
+        return self._ids[code]
+    
+    def __contains__(self, eid):
+        return eid in self._codes
+    
+    def encode(self, ids):
+        '''returns the codes of ids as an int32 array, new ids are added to the vocabulary'''
+        
+        if isinstance(ids, interned_ids) and ids.vocabulary is self:
+            return ids.codes
+        
+        codes = np.empty(len(ids), dtype=np.int32)
+        
+        for ind, x in enumerate(ids):
+            code = self._codes.get(x)
+            if code is None:
+                code = self._codes[x] = len(self._ids)
+                self._ids.append(x)
+            codes[ind] = code
+            
+        return codes
+    
+    def decode(self, codes):
+        return [self._ids[x] for x in codes]
+    
+    
+class interned_ids(collections.abc.MutableSequence):
+    
+    '''
+    A list of ids which are stored as their int32 codes in an id_vocabulary.
+    Indexing and iterating give the ids as strings, it compares equal to the list
+    of the same ids and supports the list methods (append, extend, insert, pop,
+    remove, +). Changes replace codes with a new array so copies and titer tables
+    which share the codes are not affected. It is pickled as a list, and written
+    as one by db_list.write, json.dumps needs default=list for it. tolist gives
+    a plain list.
+    '''
+    
+    __slots__ = ('codes', 'vocabulary')
+    
+    def __init__(self, codes, vocabulary):
+        
+        self.codes = codes
+        self.vocabulary = vocabulary
+        
+    def __getitem__(self, ii):
+        
+        if isinstance(ii, slice):
+            return self.vocabulary.decode(self.codes[ii])
+        
+        return self.vocabulary[self.codes[ii]]
+    
+    def __setitem__(self, ii, val):
+        
+        if isinstance(ii, slice):
+            ids = list(self)
+            ids[ii] = list(val)
+            self.codes = self.vocabulary.encode(ids)
+        else:
+            codes = self.codes.copy()
+            codes[ii] = self.vocabulary.encode([val])[0]
+            self.codes = codes
+        
+    def __delitem__(self, ii):
+        self.codes = np.delete(self.codes, ii)
+        
+    def insert(self, ii, val):
+        self.codes = np.insert(self.codes, slice(ii, None).indices(len(self.codes))[0], self.vocabulary.encode([val]))
+        
+    def extend(self, values):
+        self.codes = np.concatenate([self.codes, self.vocabulary.encode(list(values))])
+        
+    def __len__(self):
+        return len(self.codes)
+    
+    def __iter__(self):
+        return iter(self.vocabulary.decode(self.codes))
+    
+    def __add__(self, other):
+        return list(self) + list(other)
+    
+    def __radd__(self, other):
+        return list(other) + list(self)
+    
+    def tolist(self):
+        return list(self)
+    
+    def copy(self):
+        return interned_ids(self.codes, self.vocabulary)
+    
+    def __eq__(self, other):
+        
+        if isinstance(other, interned_ids) and other.vocabulary is self.vocabulary:
+            return np.array_equal(self.codes, other.codes)
+        
+        return isinstance(other, (list, interned_ids)) and list(self) == list(other)
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return repr(list(self))
+    
+    def __copy__(self):
+        return interned_ids(self.codes, self.vocabulary)
+    
+    def __deepcopy__(self, memo):
+        return interned_ids(self.codes.copy(), self.vocabulary)
+    
+    def __reduce__(self):
+        return (list, (list(self),))
+    
+    
+class titer_table():
+    
+    '''
+    The titers of an experiment result parsed once into arrays. values are log
+    titers, log2(titer/10), qualifiers are int8 codes into TITER_QUALIFIERS and
+    antigen_index, serum_index are integer codes of the ids in vocabulary.
+    
+    Titers such as '40/80' are stored as the mean of their log titers. Titers
+    which can not be reproduced exactly from (value, qualifier), such as '< 10'
+    or the 'unparsed' ones, are kept in overrides, keyed by (row, column), so
+    that to_list is always lossless.
+    '''
+    
+    def __init__(self, values, qualifiers, antigen_index, serum_index, vocabulary, overrides=None):
+        
+        assert values.shape == qualifiers.shape == (len(antigen_index), len(serum_index)), 'titer table dimensions do not match the number of antigens and sera'
+        
+        self.values = values
+        self.qualifiers = qualifiers
+        self.antigen_index = antigen_index
+        self.serum_index = serum_index
+        self.vocabulary = vocabulary
+        self.overrides = {} if overrides is None else overrides
+        
+    def __repr__(self):
+        return "<{0} {1}x{2}>".format(self.__class__.__name__, *self.shape)
+    
+    @property
+    def shape(self):
+        return self.values.shape
+    
+    @property
+    def antigen_ids(self):
+        return self.vocabulary.decode(self.antigen_index)
+    
+    @property
+    def serum_ids(self):
+        return self.vocabulary.decode(self.serum_index)
+        
+    @classmethod
+    def from_result(cls, result, vocabulary):
+        
+        '''parses the titers of a result, ids are coded with the given id_vocabulary'''
+        
+        titers = np.array(result['titers'], dtype=str).reshape(len(result['antigen_ids']), len(result['serum_ids']))
+        
+        # plates contain only a handful of distinct titers so each is parsed once
+        unique_titers, inverse = np.unique(titers, return_inverse=True)
+        parsed = [_parse_titer(x) for x in unique_titers]
+        
+        unique_values = np.array([x[0] for x in parsed], dtype=np.float64)
+        unique_qualifiers = np.array([x[1] for x in parsed], dtype=np.int8)
+        inverse = inverse.reshape(titers.shape)
+        
+        overrides = {}
+        for ind in np.flatnonzero([x[2] for x in parsed]):
+            for row, col in np.argwhere(inverse == ind):
+                overrides[(int(row), int(col))] = str(unique_titers[ind])
+        
+        return cls(unique_values[inverse], unique_qualifiers[inverse], vocabulary.encode(result['antigen_ids']),
+                   vocabulary.encode(result['serum_ids']), vocabulary, overrides)
+        
+    def to_list(self):
+        '''the titers in the string format of the titers field of results'''
+        
+        formatted = {}
+        titers = []
+        
+        for row in range(self.shape[0]):
+            titer_row = []
+            for col in range(self.shape[1]):
+                raw = self.overrides.get((row, col))
+                if raw is None:
+                    key = (self.values[row, col], self.qualifiers[row, col])
+                    if key not in formatted:
+                        formatted[key] = _format_titer(*key)
+                    raw = formatted[key]
+                titer_row.append(raw)
+            titers.append(titer_row)
+            
+        return titers
+
+
+class titer_matrix():
+    
+    '''
+    Titers of many results on common antigen and serum axes in coordinate (COO)
+    format. The titer of the i'th cell is values[i] (a log titer, see titer_table)
+    with qualifier code qualifiers[i] for antigen antigen_ids[rows[i]] and serum
+    serum_ids[cols[i]]. It was measured in the result results[sources[i]], which
+    is an (entry id, result index) pair, or it is a merge of several results if
+    sources[i] is -1. antigen_codes and serum_codes are the codes of the axes in
+    vocabulary.
+    '''
+    
+    def __init__(self, rows, cols, values, qualifiers, sources, antigen_codes, serum_codes, vocabulary, results):
+        
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+        self.qualifiers = qualifiers
+        self.sources = sources
+        self.antigen_codes = antigen_codes
+        self.serum_codes = serum_codes
+        self.vocabulary = vocabulary
+        self.results = results
+        
+    def __repr__(self):
+        return "<{0} {1}x{2}, {3} titers>".format(self.__class__.__name__, *self.shape, len(self.values))
+    
+    def __len__(self):
+        return len(self.values)
+    
+    @property
+    def shape(self):
+        return (len(self.antigen_codes), len(self.serum_codes))
+    
+    @property
+    def antigen_ids(self):
+        return self.vocabulary.decode(self.antigen_codes)
+    
+    @property
+    def serum_ids(self):
+        return self.vocabulary.decode(self.serum_codes)
+    
+    def _assert_merged(self):
+        
+        if len(self.rows)>1 and np.any((self.rows[1:] == self.rows[:-1]) & (self.cols[1:] == self.cols[:-1])):
+            raise ValueError('titer matrix contains repeated measurements, build it with a merge policy')
+    
+    def to_dense(self):
+        '''returns a titer_table of the matrix, cells without titers are empty'''
+        
+        self._assert_merged()
+        
+        values = np.full(self.shape, np.nan)
+        qualifiers = np.full(self.shape, TITER_QUALIFIERS.index('missing'), dtype=np.int8)
+        values[self.rows, self.cols] = self.values
+        qualifiers[self.rows, self.cols] = self.qualifiers
+        
+        return titer_table(values, qualifiers, self.antigen_codes, self.serum_codes, self.vocabulary)
+    
+    def to_scipy(self):
+        '''returns the log titers as a scipy.sparse.coo_matrix, requires scipy'''
+        
+        try:
+            import scipy.sparse
+        except ImportError:
+            raise ImportError('to_scipy requires scipy to be installed')
+            
+        self._assert_merged()
+        
+        return scipy.sparse.coo_matrix((self.values, (self.rows, self.cols)), shape=self.shape)
+
+
+def _check_experiment_entry(val):
+    '''
+    checks the results field of an experiment entry, this is a module level
+    function so that it can be sent to worker processes
+    '''
+    
+    assert 'results' in val and len(val['results'])>0, 'experiment entry should contain a non-empty results field'
+    assert all(isinstance(x,dict) for x in val['results']), 'all entries in results should be a dictionary'
+    assert 'description' in val and len(val['description'])>0, 'experiment entry should contain description'
+    assert 'name' in val and len(val['name'])>0, 'experiment entry should contain name'
+    
+    exp_name = val['name']
+    
+    for ind,result in enumerate(val['results']):
+        log_result = f'result {ind} of experiment {exp_name}'
+        
+        for key in REQUIRED_EXP_KEYS:
+            assert key in result, f'{key} does not exist in ' + log_result
+        
+        # check format of some critical fields 
+        assert isinstance(result['serum_ids'], (list, interned_ids)) and all(isinstance(x,str) for x in result['serum_ids']), 'serum_ids in ' + log_result + 's hould be a list of strings'
+        assert isinstance(result['antigen_ids'], (list, interned_ids)) and all(isinstance(x,str) for x in result['antigen_ids']), 'antigen_ids in ' + log_result + ' should be a list of strings'
+        assert isinstance(result['titers'],list) and all(isinstance(x,list) for x in result['titers']), 'Titers in ' + log_result + ' should be a list of lists'
+        assert all(isinstance(x,str) for titer in result['titers'] for x in titer), 'Titers in ' + log_result + ' should all be of string format.'
+        
+        # check consistency of titer format, and some size checks wr to
+        # number of antigens and sera
+        assert len(result['titers']) == len(result['antigen_ids']), 'titers in ' + log_result + ' should be a list with the same length as number of antigens'
+        assert all(len(x) == len(result['serum_ids']) for x in result['titers']), 'each element of titers list in ' + log_result +' should have the same length as number of sera'
+        invalid = _invalid_titers(result['titers'])
+        assert len(invalid) == 0, 'some titers in ' + log_result + ' have unknown format: ' + ', '.join(f'{x[2]!r} at ({x[0]}, {x[1]})' for x in invalid)
+
+
+def _invalid_titers(titers):
+    '''
+    returns (row, column, titer) for all the titers which contain characters that
+    are neither numeric nor in KNOWN_TITER_SYMBOLS. The titers are joined into a
+    single string which is scanned once with a compiled regex, the offending
+    positions are then mapped back to cells.
+    '''
+    
+    cells = [x for row in titers for x in row]
+    buffer = ''.join(cells)
+    
+    # \d does not match some numeric characters such as fractions, hence the isnumeric
+    bad_positions = [x.start() for x in INVALID_TITER_CHARACTER.finditer(buffer) if not x.group().isnumeric()]
+    
+    if len(bad_positions) == 0:
+        return []
+    
+    cell_ends = np.cumsum([len(x) for x in cells])
+    row_starts = np.cumsum([0] + [len(x) for x in titers])
+    
+    invalid = []
+    
+    for cell in np.unique(np.searchsorted(cell_ends, bad_positions, side='right')):
+        row = int(np.searchsorted(row_starts, cell, side='right')) - 1
+        col = int(cell - row_starts[row])
+        invalid.append((row, col, cells[cell]))
+        
+    return invalid
+
+
+def _parse_titer(raw):
+    '''
+    returns (log titer, qualifier code, needs override) of a titer string,
+    needs override is True when _format_titer does not give back raw. Spaces are
+    ignored, titers which pass _check_result but have no log titer, such as '0'
+    or '<>10', get the 'unparsed' code.
+    '''
+    
+    match = TITER_PATTERN.match(raw.replace(' ', ''))
+    numbers = [] if match is None else [int(x) for x in match.group(2, 3, 4) if x is not None]
+    
+    if match is None or 0 in numbers:
+        value, code = np.nan, TITER_QUALIFIERS.index('unparsed')
+    elif match.group(2) is not None:
+        value, code = np.log2(numbers[0]/10), TITER_QUALIFIERS.index(match.group(1))
+    elif match.group(3) is not None:
+        value, code = (np.log2(numbers[0]/10) + np.log2(numbers[1]/10))/2, TITER_QUALIFIERS.index('/')
+    elif match.group(5) is not None:
+        value, code = np.nan, TITER_QUALIFIERS.index(match.group(5))
+    else:
+        value, code = np.nan, TITER_QUALIFIERS.index('missing')
+        
+    return value, code, _format_titer(value, code) != raw
+    
+
+def _format_titer(value, code):
+    
+    qualifier = TITER_QUALIFIERS[code]
+    
+    if qualifier in ['*', '?']:
+        return qualifier
+    elif qualifier in ['missing', 'unparsed']:
+        return ''
+    elif qualifier == '/':
+        return f'{round(10*2**(value-0.5))}/{round(10*2**(value+0.5))}'
+    
+    return f'{qualifier}{round(10*2**value)}'
+
+
+def _list_ids(id_list):
+    '''ids of a db_list, or of any iterable of entries with an id field'''
+    if isinstance(id_list, db_list):
+        return id_list._id_list
+    
+    return [x['id'] for x in id_list]
+
+
+def _check_result_ids(entries, start, antigen_ids, serum_ids):
+    '''
+    checks the antigen and serum ids of all the results of entries in one batch
+    and returns the report of the failing results, see cross_check
+    '''
+    
+    locations = []
+    result_serum_ids = []
+    result_antigen_ids = []
+    
+    for entry in entries:
+        for ind,result in enumerate(entry['results']):
+            locations.append((entry['id'], ind))
+            result_serum_ids.append(result['serum_ids'])
+            result_antigen_ids.append(result['antigen_ids'])
+    
+    missing_sera, duplicated_sera = _missing_and_duplicated(result_serum_ids, serum_ids)
+    missing_antigens, duplicated_antigens = _missing_and_duplicated(result_antigen_ids, antigen_ids)
+    
+    failed = sorted(set(missing_sera) | set(duplicated_sera) | set(missing_antigens) | set(duplicated_antigens))
+    
+    return {locations[pos]:{'missing_sera': missing_sera.get(pos, []),
+                            'duplicated_sera': duplicated_sera.get(pos, []),
+                            'missing_antigens': missing_antigens.get(pos, []),
+                            'duplicated_antigens': duplicated_antigens.get(pos, [])}
+            for pos in failed}
+
+
+def _check_entries(entries, start, check):
+    '''applies check to entries and returns (position, message) of the ones which fail'''
+    
+    errors = []
+    
+    for pos, entry in enumerate(entries, start):
+        try:
+            check(entry)
+        except AssertionError as e:
+            errors.append((pos, str(e)))
+            
+    return errors
+
+
+def _check_slices(offsets, start, json_path, check):
+    '''_check_entries on the entries between the (start, end) byte offsets of a json file, parsed in the worker'''
+    
+    slices = _json_slices(json_path)
+    
+    try:
+        return _check_entries((slices(*x) for x in offsets), start, check)
+    finally:
+        slices.close()
+
+
+def _parallel_chunks(function, items, workers, executor, *args, merge=True):
+    '''
+    splits items into workers contiguous chunks and calls function(chunk, start, *args)
+    on each in a process or thread pool. The results are returned in the order of
+    the chunks, concatenated if merge is True.
+    '''
+    
+    items = list(items)
+    chunk_size = max(1, -(-len(items)//workers))
+    pool_class = concurrent.futures.ThreadPoolExecutor if executor == 'thread' else concurrent.futures.ProcessPoolExecutor
+    
+    with pool_class(max_workers=workers) as pool:
+        futures = [pool.submit(function, items[start:start+chunk_size], start, *args)
+                   for start in range(0, len(items), chunk_size)]
+        results = [x.result() for x in futures]
+        
+    if merge:
+        return [x for result in results for x in result]
+    
+    return results
+
+
+def _missing_and_duplicated(id_lists, list_ids):
+    '''
+    vectorised existence and uniqueness check of a batch of id lists against
+    list_ids. Returns two dictionaries which map the position of an id list
+    in id_lists to its ids which are missing from list_ids or appear in it
+    multiple times.
+    '''
+    vocabulary = id_lists[0].vocabulary if len(id_lists)>0 and isinstance(id_lists[0], interned_ids) else None
+    
+    # interned ids of a single vocabulary are compared by their codes
+    if vocabulary is not None and all(isinstance(x, interned_ids) and x.vocabulary is vocabulary for x in id_lists):
+        unique_ids, counts = np.unique(vocabulary.encode(list_ids), return_counts=True)
+        ids = np.concatenate([x.codes for x in id_lists])
+    else:
+        vocabulary = None
+        unique_ids, counts = np.unique(np.asarray(list_ids, dtype=str), return_counts=True)
+        ids = np.asarray([x for ids in id_lists for x in ids], dtype=str)
+    
+    lengths = [len(x) for x in id_lists]
+    owners = np.repeat(np.arange(len(id_lists)), lengths)
+    
+    present = np.isin(ids, unique_ids)
+    
+    if len(unique_ids)>0:
+        positions = np.searchsorted(unique_ids, ids).clip(max=len(unique_ids)-1)
+        duplicated = present & (counts[positions]>1)
+    else:
+        duplicated = np.zeros(len(ids), dtype=bool)
+        
+    return _group_ids(ids, owners, ~present, vocabulary), _group_ids(ids, owners, duplicated, vocabulary)
+
+
+def _group_ids(ids, owners, mask, vocabulary=None):
+    
+    grouped = {}
+    
+    for ind in np.flatnonzero(mask):
+        grouped.setdefault(int(owners[ind]), []).append(vocabulary[ids[ind]] if vocabulary is not None else str(ids[ind]))
+        
+    return grouped
+
+
+def _json_default(obj):
+    '''the default of json.dumps for the types which are stored in entries in place of lists'''
+    
+    if isinstance(obj, interned_ids):
+        return list(obj)
+    
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
+
+def _parse_json_array(text):
+    '''
+    parses json text whose top level is an array and returns its elements and the
+    (start, end) character spans of their text
+    '''
+    
+    decoder = json.JSONDecoder()
+    pos = JSON_WHITESPACE.match(text, 0).end()
+    
+    if text[pos:pos+1] != '[':
+        raise ValueError('provide a json file which is a list')
+    
+    elements = []
+    spans = []
+    pos = JSON_WHITESPACE.match(text, pos + 1).end()
+    
+    if text[pos:pos+1] == ']':
+        return elements, spans
+    
+    while True:
+        element, end = decoder.raw_decode(text, pos)
+        elements.append(element)
+        spans.append((pos, end))
+        
+        pos = JSON_WHITESPACE.match(text, end).end()
+        
+        if text[pos:pos+1] == ']':
+            break
+        if text[pos:pos+1] != ',':
+            raise ValueError(f'expected , or ] at character {pos} of the json text')
+        
+        pos = JSON_WHITESPACE.match(text, pos + 1).end()
+        
+    if JSON_WHITESPACE.match(text, pos + 1).end() != len(text):
+        raise ValueError(f'extra data after the json array at character {pos + 1}')
+        
+    return elements, spans
+
+
+def _iter_json_array(fileobj, memory_budget=None, chunk_size=2**16, offsets=False):
+    '''
+    parses a json file whose top level is an array and yields its elements one
+    at a time so that only the text of the element being parsed is buffered.
+    fileobj can be opened in text or binary (utf-8) mode. If memory_budget (in
+    characters) is given, a MemoryError is raised for elements that do not fit.
+    
+    If offsets is True, (element, start, end) is yielded instead where start and
+    end are the byte offsets of the element in the file, fileobj should then be
+    opened in binary mode and read from its beginning.
+    '''
+    
+    if memory_budget is not None:
+        chunk_size = min(chunk_size, memory_budget)
+        
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+    
+    buf = ''
+    pos = 0
+    byte_pos = 0  #  byte offset of buf[pos] in the file
+    eof = False
+    state = 'start'
+    
+    while True:
+        
+        new_pos = JSON_WHITESPACE.match(buf, pos).end()
+        byte_pos += new_pos - pos
+        pos = new_pos
+        
+        if pos == len(buf) or state == 'more':
+            
+            if eof:
+                raise ValueError('json array ended unexpectedly')
+            
+            read_size = chunk_size if state != 'more' else max(chunk_size, len(buf) - pos)
+            if memory_budget is not None:
+                if len(buf) - pos >= memory_budget:
+                    raise MemoryError(f'an entry does not fit in the memory budget of {memory_budget} characters')
+                read_size = min(read_size, memory_budget - (len(buf) - pos))
+                
+            chunk = fileobj.read(read_size)
+            eof = len(chunk) == 0
+            
+            if isinstance(chunk, bytes):
+                chunk = utf8_decoder.decode(chunk, final=eof)
+                
+            buf = buf[pos:] + chunk
+            pos = 0
+            state = 'value' if state == 'more' else state
+            continue
+        
+        if state == 'start':
+            if buf[pos] != '[':
+                raise ValueError('provide a json file which is a list')
+            pos += 1
+            byte_pos += 1
+            state = 'first'
+            
+        elif state in ('first', 'value'):
+            if state == 'first' and buf[pos] == ']':
+                return
+            
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                state = 'more'
+                continue
+            
+            # a value which ends with the buffer might be a truncated one
+            if end == len(buf) and not eof:
+                state = 'more'
+                continue
+                
+            if offsets:
+                end_byte = byte_pos + len(buf[pos:end].encode('utf-8'))
+                yield value, byte_pos, end_byte
+                byte_pos = end_byte
+            else:
+                yield value
+                
+            pos = end
+            state = 'separator'
+            
+        else:
+            if buf[pos] == ']':
+                return
+            elif buf[pos] != ',':
+                raise ValueError(f'unexpected character {buf[pos]} between the elements of the json array')
+            pos += 1
+            byte_pos += 1
+            state = 'value'
+
+
+def _write_entries(entries, path, compact=False):
+    '''
+    writes entries as a json list in the same format as json.dump(entries, indent=4)
+    followed by two newlines, or in the compact format of _compact_json. The entries
+    are streamed into a temporary file in the directory of path which is synced to
+    disk and then atomically renamed to path.
+    '''
+    
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as json_file:
+            
+            json_file.write('[')
+            
+            ind = -1
+            
+            for ind, entry in enumerate(entries):
+                json_file.write(',\n    ' if ind>0 else '\n    ')
+                
+                if compact:
+                    json_file.write(_compact_json(entry, 1))
+                else:
+                    json_file.write(json.dumps(entry, indent=4, ensure_ascii=False, default=_json_default).replace('\n', '\n    '))
+                    
+            json_file.write('\n]' if ind>=0 else ']')
+            json_file.write("\n")  # Add newline at the end of the last line 
+            json_file.write("\n")  # Add newline after the json data   
+            
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        
+        # keep the permissions of the file being replaced, or use the default ones
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+            
+        os.replace(tmp_path, path)
+        
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _compact_json(obj, level=0):
+    '''
+    json with an indentation of 4 like json.dumps(obj, indent=4) except that
+    lists which contain no lists or dictionaries are written on a single line
+    '''
+    
+    indent = '    '
+    
+    if isinstance(obj, dict) and len(obj)>0:
+        items = [indent*(level+1) + json.dumps(key, ensure_ascii=False) + ': ' + _compact_json(value, level+1)
+                 for key, value in obj.items()]
+        return '{\n' + ',\n'.join(items) + '\n' + indent*level + '}'
+    
+    if isinstance(obj, interned_ids):
+        obj = list(obj)
+    
+    if isinstance(obj, list) and any(isinstance(x, (dict, list)) for x in obj):
+        items = [indent*(level+1) + _compact_json(value, level+1) for value in obj]
+        return '[\n' + ',\n'.join(items) + '\n' + indent*level + ']'
+    
+    return json.dumps(obj, ensure_ascii=False)
+
+
+class _lazy_entries(collections.abc.MutableSequence):
+    '''
+    The entries of a lazily loaded db_list. Entries which have not been accessed
+    yet are stored as tuples of arguments of load, they are built with load (and
+    passed to check if given) on first access and then cached. peek builds them
+    with peek_load if given, for loaders which keep data of the entries they build.
+    '''
+    
+    def __init__(self, items, load, check=None, peek_load=None):
+        
+        self._items = list(items)
+        self._load_item = load
+        self._peek_item = load if peek_load is None else peek_load
+        self._check = check
+            
+    def peek(self, ii):
+        '''the entry at ii, which is built but not cached if it has not been accessed yet'''
+        
+        item = self._items[ii]
+        
+        if isinstance(item, tuple):
+            item = self._peek_item(*item)
+            
+            if self._check is not None:
+                self._check(item)
+                
+        return item
+            
+    def _load(self, ii):
+        
+        item = self._items[ii]
+        
+        if isinstance(item, tuple):
+            item = self._load_item(*item)
+            
+            if self._check is not None:
+                self._check(item)
+                
+            self._items[ii] = item
+            
+        return item
+    
+    def __getitem__(self, ii):
+        
+        if isinstance(ii, slice):
+            return [self._load(x) for x in range(len(self._items))[ii]]
+        
+        return self._load(ii)
+    
+    def __setitem__(self, ii, val):
+        self._items[ii] = val
+        
+    def __delitem__(self, ii):
+        del self._items[ii]
+        
+    def __len__(self):
+        return len(self._items)
+    
+    def __repr__(self):
+        return repr(list(self))
+    
+    def insert(self, ii, val):
+        self._items.insert(ii, val)
+        
+    def reverse(self):
+        self._items.reverse()
+    
+    
+class _view_entries(collections.abc.Sequence):
+    '''
+    The entries of a view, which are the entries of the parent db_list at
+    positions. update keeps the positions in line with changes of the parent.
+    '''
+    
+    def __init__(self, parent, positions):
+        
+        self._parent = parent
+        self.positions = positions
+        self.stale = False
+        self._order = None  #  argsort of positions, used to look up ids
+        
+    def entries(self):
+        
+        if self.stale:
+            raise ValueError(f'entries of this view were removed from {self._parent.__class__.__name__} {self._parent.name}, create a new view')
+        
+        return self._parent._list
+    
+    def __getitem__(self, ii):
+        
+        entries = self.entries()
+        
+        if isinstance(ii, slice):
+            return [entries[x] for x in self.positions[ii].tolist()]
+        
+        return entries[int(self.positions[ii])]
+    
+    def __len__(self):
+        return len(self.positions)
+    
+    def __repr__(self):
+        return repr(list(self))
+    
+    def position(self, parent_position):
+        '''position in the view of the entry at parent_position of the parent, or None'''
+        
+        if self._order is None:
+            self._order = np.argsort(self.positions, kind='stable')
+            
+        ind = np.searchsorted(self.positions, parent_position, sorter=self._order)
+        
+        if ind < len(self.positions) and self.positions[self._order[ind]] == parent_position:
+            return int(self._order[ind])
+        
+        return None
+    
+    def update(self, op, ii, entries):
+        
+        self._order = None
+        
+        if op == 'insert':
+            self.positions[self.positions >= ii] += len(entries)
+        elif op == 'reverse':
+            self.positions = len(self._parent._list) - 1 - self.positions
+        else:
+            removed = np.sort(np.atleast_1d(np.asarray(ii, dtype=np.int64)))
+            
+            if np.isin(self.positions, removed).any():
+                self.stale = True
+            else:
+                self.positions -= np.searchsorted(removed, self.positions)
+    
+    
+class _view_ids(collections.abc.Sequence):
+    '''the ids of a view, read from the id list of its parent'''
+    
+    def __init__(self, entries):
+        self._entries = entries
+        
+    def __getitem__(self, ii):
+        
+        id_list = self._entries._parent._id_list
+        
+        if isinstance(ii, slice):
+            return [id_list[x] for x in self._entries.positions[ii].tolist()]
+        
+        return id_list[int(self._entries.positions[ii])]
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    
+class _view_index(collections.abc.Mapping):
+    '''id -> position in the view, looked up through the id index of its parent'''
+    
+    def __init__(self, entries):
+        self._entries = entries
+        
+    def __getitem__(self, eid):
+        
+        self._entries.entries()
+        position = self._entries.position(self._entries._parent._id_index[eid])
+        
+        if position is None:
+            raise KeyError(eid)
+        
+        return position
+    
+    def __iter__(self):
+        return iter(_view_ids(self._entries))
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    
+class _sqlite_entries(collections.abc.MutableSequence):
+    '''
+    The entries of a db_list opened on a table of a sqlite_store. The keys of the
+    entries are read when the list is opened and entries are read by key on access
+    (and passed to check if given), so positions shifted by other lists do not
+    change which entry is read. Changes are written through to the database and
+    are refused once another list has changed the table, see sqlite_store.
+    '''
+    
+    def __init__(self, store, table, check=None):
+        
+        self._store = store
+        self._table = store._table(table)
+        self._check = check
+        self._version, self._keys, self.ids = store.rows(table)
+        
+    def __getitem__(self, ii):
+        
+        if isinstance(ii, slice):
+            return [self[x] for x in range(len(self._keys))[ii]]
+        
+        try:
+            entry = self._store.get(self._table, self._keys[ii])
+        except KeyError:
+            raise RuntimeError(f'entry {ii} of {self._table} has been removed by another list, open it again')
+        
+        if self._check is not None:
+            self._check(entry)
+            
+        return entry
+    
+    def __setitem__(self, ii, val):
+        
+        pos = range(len(self._keys))[ii]
+        self._keys[pos] = self._store.replace(self._table, pos, val, self._version)
+        self._version += 1
+        
+    def __delitem__(self, ii):
+        
+        positions = range(len(self._keys))[ii] if isinstance(ii, slice) else range(range(len(self._keys))[ii], range(len(self._keys))[ii]+1)
+        
+        if len(positions) == 0:
+            return
+        
+        if positions.step == 1:
+            self._store.delete(self._table, positions.start, positions.stop, self._version)
+            self._version += 1
+        else:
+            for pos in sorted(positions, reverse=True):
+                self._store.delete(self._table, pos, None, self._version)
+                self._version += 1
+                
+        del self._keys[ii]
+        
+    def __len__(self):
+        return len(self._keys)
+    
+    def __repr__(self):
+        return repr(list(self))
+    
+    def insert(self, ii, val):
+        self.extend([val], ii)
+        
+    def extend(self, values, ii=None):
+        
+        values = list(values)
+        ii = len(self._keys) if ii is None else slice(ii, None).indices(len(self._keys))[0]
+        
+        self._keys[ii:ii] = self._store.insert(self._table, ii, values, self._version)
+        self._version += 1
+        
+    def reverse(self):
+        
+        self._store.reverse(self._table, self._version)
+        self._version += 1
+        self._keys.reverse()
+        
+    @property
+    def store(self):
+        return self._store
+    
+        
+class _json_slices():
+    '''parses the entry between the byte offsets start and end of a json file'''
+    
+    def __init__(self, json_path, use_mmap=False):
+        
+        self._fileobj = open(json_path, 'rb')
+        
+        if use_mmap:
+            self._buffer = mmap.mmap(self._fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._buffer = None
+            
+    def __call__(self, start, end):
+        
+        if self._buffer is not None:
+            text = self._buffer[start:end]
+        else:
+            self._fileobj.seek(start)
+            text = self._fileobj.read(end - start)
+            
+        return json.loads(text)
+    
+    def close(self):
+        
+        if self._buffer is not None:
+            self._buffer.close()
+        self._fileobj.close()
+    
+    
+def _field_values(entry, path):
+    '''the values of the field of entry at the dot separated key path, as a list of hashables'''
+    
+    value = entry
+    
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return []
+        value = value[key]
+        
+    return [_hashable(x) for x in value] if isinstance(value, list) else [_hashable(value)]
+
+
+def _hashable(value):
+    '''
+    the index key of a field value, which is paired with its kind so that True
+    and 1 or a dictionary and its json string do not share a key. Integers and
+    floats are both json numbers and are kept together.
+    '''
+    
+    if isinstance(value, bool):
+        return (bool, value)
+    elif isinstance(value, (int, float)):
+        return (float, value)
+    elif isinstance(value, (dict, list)):
+        return (dict, json.dumps(value, sort_keys=True))
+    
+    return (type(value), value)
+
+
+def _experiment_stub(entry):
+    '''a copy of an experiment entry with its antigen_ids, serum_ids and titers replaced by placeholders'''
+    
+    # the placeholders are kept to preserve the order of the keys
+    stub = entry.copy()
+    stub['results'] = [{key:None if key in ('antigen_ids', 'serum_ids', 'titers') else value for key,value in result.items()}
+                       for result in entry['results']]
+    
+    return stub
+
+
+def _sqlite_store_of(db, table):
+    '''the sqlite_store which a db_list is opened on if it is the given table of it, otherwise None'''
+    
+    entries = getattr(db, '_list', None)
+    
+    if isinstance(entries, _sqlite_entries) and entries._table == table:
+        return entries.store
+    
+    return None
+
+
+def _load_shard(path):
+    '''reads a shard, this is a module level function so that it can be sent to worker processes'''
+    
+    with open(path, 'r') as fileobj:
+        return json.load(fileobj)
+
+
+def _file_digest(path):
+    '''sha256 of the content of a file'''
+    
+    digest = hashlib.sha256()
+    
+    with open(path, 'rb') as fileobj:
+        for chunk in iter(lambda: fileobj.read(2**20), b''):
+            digest.update(chunk)
+            
+    return digest.hexdigest()
+
+
+def _read_snapshot(path):
+    '''returns the memory mapped arrays and the meta data of a snapshot directory'''
+    
+    with open(os.path.join(path, 'meta.json'), 'r') as fileobj:
+        meta = json.load(fileobj)
+        
+    assert meta['format'] == SNAPSHOT_FORMAT, f'snapshot {path} has an unknown format'
+    
+    arrays = {}
+    
+    for file_name in os.listdir(path):
+        if file_name.endswith('.npy'):
+            array_path = os.path.join(path, file_name)
+            try:
+                arrays[file_name[:-4]] = np.load(array_path, mmap_mode='r')
+            except ValueError:  #  empty arrays can not be memory mapped
+                arrays[file_name[:-4]] = np.load(array_path)
+                
+    return arrays, meta
+    
+
+def _entry_digest(entry):
+    '''digest of the canonical json of an entry, which does not depend on the order of its keys'''
+    
+    text = json.dumps(entry, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+    
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+@functools.lru_cache(maxsize=None)
+def _module_digest():
+    '''digest of this module, validation cache records of other versions of the tests are not used'''
+    return _file_digest(__file__)
+
+
+def _validation_cache_path(cache_dir, record):
+    
+    key = hashlib.sha256((record['kind'] + '\n' + record['path']).encode('utf-8')).hexdigest()
+    
+    return os.path.join(cache_dir, key + '.json')
+
+
+def _read_validation_cache(cache_path):
+    
+    try:
+        with open(cache_path, 'r') as fileobj:
+            return json.load(fileobj)
+    except (OSError, ValueError):
+        return None
+    
+
+def _write_validation_cache(cache_dir, cache_path, record):
+    '''writes a record of the validation cache and evicts the least recently used ones beyond VALIDATION_CACHE_SIZE'''
+    
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        
+        with open(cache_path + '.tmp', 'w') as fileobj:
+            json.dump(record, fileobj)
+            
+        os.replace(cache_path + '.tmp', cache_path)
+        
+        records = [os.path.join(cache_dir, x) for x in os.listdir(cache_dir) if x.endswith('.json')]
+        records = sorted((os.stat(x).st_mtime_ns, os.stat(x).st_size, x) for x in records)
+        total = sum(x[1] for x in records)
+        
+        for _, size, path in records:
+            if total <= VALIDATION_CACHE_SIZE:
+                break
+            if path != cache_path:
+                os.remove(path)
+                total -= size
+            
+    except OSError as e:
+        logging.warning(f'could not update the validation cache {cache_dir}: {e}')
+        
+
+def _byte_index(json_path):
+    '''
+    returns the (start, end) byte offsets and the ids of the entries of a json
+    file. These are read from the sidecar file json_path + '.idx' if it is up to
+    date with respect to the size and modification time of the json file,
+    otherwise (or if it can not be read) the json file is scanned once and the
+    sidecar file is atomically rewritten.
+    '''
+    
+    index_path = json_path + '.idx'
+    stat = os.stat(json_path)
+    
+    # an index which can not be read or is malformed is treated as out of date
+    try:
+        with open(index_path, 'r') as fileobj:
+            index = json.load(fileobj)
+            
+        if index['size'] == stat.st_size and index['mtime_ns'] == stat.st_mtime_ns:
+            offsets = [(int(start), int(end)) for start, end in index['offsets']]
+            if len(offsets) == len(index['ids']):
+                return offsets, list(index['ids'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+        
+    offsets = []
+    ids = []
+    
+    with open(json_path, 'rb') as fileobj:
+        for entry, start, end in _iter_json_array(fileobj, offsets=True):
+            assert isinstance(entry, dict), 'provide a json file which is a list of dictionaries'
+            offsets.append((start, end))
+            ids.append(entry['id'])
+            
+    index = {'size':stat.st_size, 'mtime_ns':stat.st_mtime_ns, 'offsets':offsets, 'ids':ids}
+    
+    try:
+        with open(index_path + '.tmp', 'w') as fileobj:
+            json.dump(index, fileobj)
+            
+        os.replace(index_path + '.tmp', index_path)
+    except OSError as e:
+        logging.warning(f'could not write the index file {index_path}: {e}')
+        
+    return offsets, ids
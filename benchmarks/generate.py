@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Synthetic antigen, serum and experiment datasets in the format of the files in
+tests/test_datasets, for benchmarking AcDb at sizes which the test datasets do
+not reach. Everything is drawn from a seeded numpy generator so that the same
+arguments always produce the same files.
+
+    python generate.py output_dir --antigens 2000 --sera 500 --experiments 200
+'''
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AcDb import ID_ALPHABET, ID_LENGTH
+
+
+PLACES = ['VIETNAM', 'HONG-KONG', 'CAMBODIA', 'INDONESIA', 'ANHUI', 'HUBEI', 'EGYPT', 'BANGLADESH', 'CHINA', 'INDIA']
+HOSTS = ['', '', '', 'DUCK/', 'CHICKEN/', 'COMMON-MAGPIE/']
+CLADES = ['clade 0', 'clade 1', 'clade 2.1', 'clade 2.2', 'clade 2.2.x', 'clade 2.3.2', 'clade 2.3.4', 'clade 7']
+PASSAGES = ['SIAT', 'MDCK', 'E', 'CELL']
+
+# the fraction of plain, thresholded (<, >), range (/) and not done (*) titers
+QUALIFIER_MIX = {'': 0.6, '<': 0.25, '>': 0.02, '/': 0.1, '*': 0.03}
+
+
+def generate_ids(n, rng, exclude=()):
+    '''n unique ids in the format of db_list.generate_new_ids which are not in exclude'''
+
+    ids = []
+    seen = set(exclude)
+
+    while len(ids) < n:
+        for eid in map(''.join, rng.choice(ID_ALPHABET, size=(n, ID_LENGTH))):
+            if eid not in seen and len(ids) < n:
+                seen.add(eid)
+                ids.append(eid)
+
+    return ids
+
+
+def _strain_name(rng):
+
+    return 'A/{0}{1}/{2}/{3}'.format(rng.choice(HOSTS), rng.choice(PLACES), rng.integers(1, 10000), rng.integers(1996, 2024))
+
+
+def generate_antigens(n, rng, exclude=()):
+
+    return [{'id':eid, 'long':_strain_name(rng), 'wildtype':bool(rng.random() < 0.3),
+             'passage':{'history':[str(rng.choice(PASSAGES))]}, 'groups':['WT strain', str(rng.choice(CLADES))]}
+            for eid in generate_ids(n, rng, exclude)]
+
+
+def generate_sera(n, antigens, rng, exclude=()):
+
+    return [{'id':eid, 'long':antigens[ind]['long'], 'strain_id':antigens[ind]['id'],
+             'animal_id':f'F{rng.integers(1, 100)}_{rng.integers(1, 20)}', 'meta':{'group':'WT sera'}}
+            for eid, ind in zip(generate_ids(n, rng, exclude), rng.integers(0, len(antigens), n))]
+
+
+def generate_titers(shape, rng, qualifier_mix=None):
+    '''a plate of titers of the given shape with qualifiers drawn from qualifier_mix'''
+
+    qualifier_mix = QUALIFIER_MIX if qualifier_mix is None else qualifier_mix
+
+    qualifiers = list(qualifier_mix)
+    probabilities = np.array([qualifier_mix[x] for x in qualifiers], dtype=float)
+    drawn = rng.choice(len(qualifiers), size=shape, p=probabilities/probabilities.sum())
+    dilutions = 10*2**rng.integers(0, 10, size=shape)
+
+    formats = {'':'{0}', '<':'<{0}', '>':'>{0}', '/':'{0}/{1}', '*':'*'}
+
+    return [[formats[qualifiers[drawn[row, col]]].format(dilutions[row, col], 2*dilutions[row, col]) for col in range(shape[1])]
+            for row in range(shape[0])]
+
+
+def generate_experiments(n, antigen_ids, serum_ids, rng, results_per_experiment=2, plate_shape=(10, 10),
+                         qualifier_mix=None, exclude=()):
+    '''
+    n experiments with results_per_experiment results each. Every result is a plate
+    of plate_shape (antigens, sera) drawn from antigen_ids and serum_ids.
+    '''
+
+    experiments = []
+
+    for eid in generate_ids(n, rng, exclude):
+        results = []
+
+        for _ in range(results_per_experiment):
+            result_antigens = rng.choice(antigen_ids, size=min(plate_shape[0], len(antigen_ids)), replace=False).tolist()
+            result_sera = rng.choice(serum_ids, size=min(plate_shape[1], len(serum_ids)), replace=False).tolist()
+
+            results.append({'assay':str(rng.choice(['HI', 'HI', 'HI', 'MN'])), 'conducted_by':'',
+                            'date':f'{rng.integers(2005, 2024)}-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}',
+                            'comments':'', 'file':'', 'antigen_ids':result_antigens, 'serum_ids':result_sera,
+                            'titers':generate_titers((len(result_antigens), len(result_sera)), rng, qualifier_mix)})
+
+        experiments.append({'name':f'Synthetic experiment {eid}', 'id':eid, 'description':'Synthetic data', 'results':results})
+
+    return experiments
+
+
+def write_dataset(directory, n_antigens, n_sera, n_experiments, results_per_experiment=2, plate_shape=(10, 10),
+                  qualifier_mix=None, seed=0):
+    '''
+    writes antigens.json, sera.json and results.json to directory and returns
+    their paths. Ids are unique across the three files.
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    antigens = generate_antigens(n_antigens, rng)
+    sera = generate_sera(n_sera, antigens, rng, exclude=[x['id'] for x in antigens])
+    experiments = generate_experiments(n_experiments, [x['id'] for x in antigens], [x['id'] for x in sera], rng,
+                                       results_per_experiment, plate_shape, qualifier_mix,
+                                       exclude=[x['id'] for x in antigens + sera])
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+
+    for file_name, entries in [('antigens.json', antigens), ('sera.json', sera), ('results.json', experiments)]:
+        path = os.path.join(directory, file_name)
+
+        with open(path, 'w') as fileobj:
+            json.dump(entries, fileobj, indent=4)
+            fileobj.write('\n\n')
+
+        paths.append(path)
+
+    return paths
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='writes a synthetic AcDb dataset')
+    parser.add_argument('directory')
+    parser.add_argument('--antigens', type=int, default=1000)
+    parser.add_argument('--sera', type=int, default=200)
+    parser.add_argument('--experiments', type=int, default=100)
+    parser.add_argument('--results', type=int, default=2, help='results per experiment')
+    parser.add_argument('--plate', type=int, nargs=2, default=[10, 10], help='antigens and sera per result')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for path in write_dataset(args.directory, args.antigens, args.sera, args.experiments, args.results, tuple(args.plate), seed=args.seed):
+        print(path)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''
+Times and memory profiles the main operations of AcDb on synthetic datasets of
+increasing size (see generate.py) and writes the measurements as json, so that
+the output of two versions can be compared.
+
+    python run_benchmarks.py --sizes 1 10 --output benchmarks.json
+
+A size of s means 1000*s antigens, 200*s sera and 100*s experiments. Each
+operation is timed repeat times and the fastest run is reported, its peak
+memory is measured with tracemalloc in a separate run.
+'''
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import argparse
+import contextlib
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AcDb
+from AcDb import db_experiment_list, db_anti_list
+from generate import write_dataset
+
+
+def measure(function, setup=None, repeat=3):
+    '''
+    returns the fastest time of function(setup()) out of repeat runs and its peak
+    traced memory in bytes. setup is not timed, its result is passed to function.
+    '''
+
+    times = []
+
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        gc.collect()
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+
+    argument = setup() if setup is not None else None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return min(times), peak
+
+
+def benchmarks(antigens_path, sera_path, results_path, output_dir, n_calls):
+    '''the operations to measure as (name, function, setup)'''
+
+    def loaded(_=None):
+        return (db_anti_list(antigens_path), db_anti_list(sera_path), db_experiment_list(results_path))
+
+    def checked(_=None):
+        antigen_list, serum_list, exp_list = loaded()
+        exp_list.cross_check(antigen_list, serum_list)
+        return exp_list
+
+    def load_experiments(_):
+        db_experiment_list(results_path)
+
+    def load_antigens(_):
+        db_anti_list(antigens_path)
+
+    def check_results(exp_list):
+        for entry in exp_list:
+            exp_list._check_result(entry)
+
+    def cross_check(lists):
+        lists[2].cross_check(lists[0], lists[1], full=True)
+
+    def generate_new_id(lists):
+        for _ in range(n_calls):
+            lists[0].generate_new_id()
+
+    def create_entry(lists):
+        for ind in range(n_calls):
+            lists[0].create_entry(f'A/BENCHMARK/{ind}/2024')
+
+    def write(exp_list):
+        exp_list.write(os.path.join(output_dir, 'written.json'))
+
+    return [('db_list.__init__ (experiments)', load_experiments, None),
+            ('db_list.__init__ (antigens)', load_antigens, None),
+            ('_check_result', check_results, lambda: loaded()[2]),
+            ('cross_check', cross_check, loaded),
+            (f'generate_new_id x{n_calls}', generate_new_id, loaded),
+            (f'create_entry x{n_calls}', create_entry, loaded),
+            ('write', write, checked)]
+
+
+def run(sizes, repeat=3, n_calls=100, seed=0):
+
+    measurements = []
+    output_dir = tempfile.mkdtemp()
+
+    try:
+        for size in sizes:
+            counts = {'antigens':1000*size, 'sera':200*size, 'experiments':100*size}
+            paths = write_dataset(output_dir, counts['antigens'], counts['sera'], counts['experiments'], seed=seed)
+
+            for name, function, setup in benchmarks(*paths, output_dir, n_calls):
+                seconds, peak = measure(function, setup, repeat)
+                measurements.append({'operation':name, 'size':size, **counts, 'seconds':seconds, 'peak_bytes':peak})
+                print(f'{name:<32} size {size:<4} {seconds:10.4f} s {peak/2**20:10.2f} MiB', file=sys.stderr)
+    finally:
+        shutil.rmtree(output_dir)
+
+    return {'acdb_digest':AcDb._module_digest(), 'python':platform.python_version(), 'numpy':np.__version__,
+            'platform':platform.platform(), 'repeat':repeat, 'measurements':measurements}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='benchmarks AcDb on synthetic datasets')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--calls', type=int, default=100, help='number of calls of the per-entry operations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='json file for the measurements, printed if not given')
+    args = parser.parse_args()
+
+    # the messages printed by AcDb are kept out of the json output
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args.sizes, args.repeat, args.calls, args.seed)
+
+    if args.output is None:
+        print(json.dumps(report, indent=4))
+    else:
+        with open(args.output, 'w') as fileobj:
+            json.dump(report, fileobj, indent=4)
@@ -256,3 +256,608 @@ try:
     exp_list.write(database_dir+'test_results3.json')
 except ValueError as e:
     print(e)
+
+
+# In[18]:
+
+
+# ids are indexed so membership tests and lookups by id do not scan the list.
+# the index is kept up to date by insert, append, pop, reverse and del
+
+assert 'AAAAAA' in antigen_list and 'ZZZZZZ' not in antigen_list
+assert antigen_list.get_by_id('AAAAAA')['long'] == 'Antigen1'
+
+antigen_list.reverse()
+del antigen_list[0]
+assert 'AAAAAA' not in antigen_list
+assert antigen_list.get_by_id('14846I') is antigen_list[-1]
+
+
+# In[19]:
+
+
+# cross_check also returns a report of the failing results keyed by
+# (experiment id, result index)
+
+report = exp_list.cross_check(antigen_list, serum_list)
+print(report)
+assert len(report) == 1
+assert list(report.values())[0]['missing_antigens'] == ['AAAAAA']
+assert list(report.values())[0]['missing_sera'] == []
+
+
+# In[20]:
+
+
+# verdicts of cross checks are cached, appending an entry or changing the
+# antigen and serum lists only marks the affected entries for re-checking
+
+antigen_list.create_entry('Antigen1','AAAAAA')
+assert exp_list._dirty == {list(report)[0][0]}
+
+result = [{'antigen_ids':['14846I'], 'serum_ids':['8VCWN7'], 'date':'now', 
+           'file':'fake.csv', 'conducted_by':'Sina', 'assay':'HI', 'titers':[['40']]}]
+exp_list.create_entry('Another result', 'Some fake new result', result)
+
+try:
+    exp_list.write(database_dir+'test_results3.json')
+except ValueError as e:
+    print(e)
+    
+assert len(exp_list._dirty) == 2
+assert exp_list.cross_check(antigen_list, serum_list) == {}
+exp_list.write(database_dir+'test_results3.json')
+
+
+# In[21]:
+
+
+# lists can also be loaded in streaming mode where the file is parsed and
+# checked one entry at a time, optionally within a memory budget
+
+with open(database_dir+'test_results.json', 'rb') as fileobj:
+    streamed_list = db_experiment_list.from_stream(fileobj, memory_budget=10**6)
+    
+assert streamed_list[0] == db_experiment_list(database_dir+'test_results.json')[0]
+
+try:
+    db_anti_list(database_dir+'test_antigens.json', stream=True, memory_budget=50)
+except MemoryError as e:
+    print(e)
+
+
+# In[22]:
+
+
+# in lazy mode only the ids and byte offsets of the entries are read from a
+# sidecar index file, entries are parsed and checked when they are first accessed
+
+import shutil
+import tempfile
+
+tmp_dir = tempfile.mkdtemp()
+shutil.copy(database_dir+'test_results2.json', tmp_dir)
+
+lazy_list = db_experiment_list(tmp_dir+'/test_results2.json', lazy=True, use_mmap=True)
+assert os.path.exists(tmp_dir+'/test_results2.json.idx')
+assert isinstance(lazy_list._list._items[0], tuple)
+assert lazy_list[0] == db_experiment_list(database_dir+'test_results2.json')[0]
+
+# a truncated index file is rebuilt
+with open(tmp_dir+'/test_results2.json.idx', 'r+') as fileobj:
+    fileobj.truncate(10)
+assert db_experiment_list(tmp_dir+'/test_results2.json', lazy=True)[0] == lazy_list[0]
+with open(tmp_dir+'/test_results2.json.idx', 'r') as fileobj:
+    assert json.load(fileobj)['ids'] == [x['id'] for x in lazy_list]
+
+
+# In[23]:
+
+
+# the titers of each result can be obtained as a titer_table which holds
+# log titers and qualifier codes as arrays and converts back losslessly
+
+table = exp_list.titer_table(0, 0)
+print(table, table.values[0], table.qualifiers[0])
+assert table.to_list() == exp_list[0]['results'][0]['titers']
+assert table.antigen_ids == exp_list[0]['results'][0]['antigen_ids']
+
+# spaces are ignored, titers without a log titer are kept apart from '?'
+
+import numpy as np
+import AcDb
+
+for raw, value, qualifier in [('< 10', 0, '<'), ('10 ', 0, ''), ('?', None, '?'), ('0', None, 'unparsed')]:
+    parsed = AcDb._parse_titer(raw)
+    assert AcDb.TITER_QUALIFIERS[parsed[1]] == qualifier and (np.isnan(parsed[0]) if value is None else parsed[0] == value)
+
+
+# In[24]:
+
+
+# all the titers with unknown format are reported at once with their position
+
+results = [{'antigen_ids':['AAAAAA', 'CCCCCC'], 'serum_ids':['BBBBBB'], 'date':'now', 
+            'file':'fake.csv', 'conducted_by':'Sina', 'assay':'HI', 'titers':[['put later'], ['4O']]}]
+try:
+    exp_list.create_entry(ename='New entry', edesc='New entry created to fail', eresults=results)
+except AssertionError as e:
+    print(e)
+    assert "'put later' at (0, 0)" in str(e) and "'4O' at (1, 0)" in str(e)
+
+
+# In[25]:
+
+
+# entries can be checked in parallel when loading, and cross checks can be
+# split across threads. the outcome is the same as the serial one
+
+parallel_list = db_experiment_list(database_dir+'test_results2.json', workers=2, executor='thread')
+assert parallel_list.cross_check(antigen_list, serum_list, workers=2) == \
+    db_experiment_list(database_dir+'test_results2.json').cross_check(antigen_list, serum_list)
+
+# worker processes parse their own part of the file and only send back errors
+with open(database_dir+'test_results2.json', 'r') as fileobj:
+    corrupted = json.load(fileobj)
+corrupted[-1]['results'][0]['titers'][0][0] = 'garbage!!'
+with open(tmp_dir+'/corrupted_results.json', 'w') as fileobj:
+    json.dump(corrupted, fileobj, indent=4)
+
+try:
+    db_experiment_list(tmp_dir+'/corrupted_results.json', workers=2)
+    raise RuntimeError('a corrupted file was loaded')
+except AssertionError as e:
+    assert f'entry {len(corrupted)-1}:' in str(e) and 'garbage!!' in str(e)
+assert os.path.exists(tmp_dir+'/corrupted_results.json.idx')
+
+
+# In[26]:
+
+
+# batches of entries can be added with extend or create_entries, the whole
+# batch is checked first so either all of them are added or none
+
+antigen_list._check_new_entries = True
+n_antigens = len(antigen_list)
+
+try:
+    antigen_list.create_entries(['Antigen2', 'Antigen3'], ['CCCCCC', 'CCCCCC'])
+except ValueError as e:
+    print(e)
+    
+assert len(antigen_list) == n_antigens
+antigen_list.create_entries(['Antigen%d'%x for x in range(100)])
+assert len(antigen_list) == n_antigens + 100
+
+
+# In[27]:
+
+
+# ids are drawn in bulk from a random generator which can be seeded for
+# reproducibility. handed out ids are reserved until they are added or released
+
+antigen_list.seed_ids(2021)
+new_ids = antigen_list.generate_new_ids(3)
+assert len(set(new_ids)) == 3 and not any(x in antigen_list for x in new_ids)
+assert not set(new_ids) & set(antigen_list.generate_new_ids(1000))
+antigen_list.release_ids(new_ids)
+
+# ids of single entries are not reserved, and generated ids of failed batches are released
+n_reserved = len(antigen_list._reserved_ids)
+antigen_list.generate_new_id()
+try:
+    antigen_list.create_entry('')
+except AssertionError:
+    pass
+try:
+    antigen_list.create_entries(['Antigen', ''])
+except AssertionError:
+    pass
+assert len(antigen_list._reserved_ids) == n_reserved
+
+
+# In[28]:
+
+
+# lists are written through a temporary file which atomically replaces the
+# target. the compact format keeps titer rows on one line and loads the same
+
+exp_list1 = db_experiment_list(database_dir+'test_results2.json')
+exp_list1._cross_check_required = False
+exp_list1.write(tmp_dir+'/compact_results.json', compact=True)
+
+with open(tmp_dir+'/compact_results.json', 'r') as fileobj:
+    print(fileobj.read()[:400])
+    
+assert deep_eq(list(db_experiment_list(tmp_dir+'/compact_results.json')), list(exp_list1))
+assert [x for x in os.listdir(tmp_dir) if x.endswith('.tmp')] == []
+
+
+# In[29]:
+
+
+# with journal=True edits are appended to a small journal file next to the
+# json file and replayed when the list is loaded again, compact folds them in
+
+shutil.copy(database_dir+'test_sera.json', tmp_dir)
+
+journaled_list = db_anti_list(tmp_dir+'/test_sera.json', journal=True)
+journaled_list.create_entry('Serum2', 'DDDDDD')
+journaled_list.pop(0)
+
+reloaded_list = db_anti_list(tmp_dir+'/test_sera.json', journal=True)
+assert list(reloaded_list) == list(journaled_list)
+
+assert reloaded_list._edited
+reloaded_list.compact()
+assert list(db_anti_list(tmp_dir+'/test_sera.json')) == list(journaled_list)
+assert not reloaded_list._edited
+
+# journals are matched to the content of the json file, so they survive copies
+# which do not keep modification times, and the journal of another file is kept aside
+reloaded_list.create_entry('Serum3', 'EEEEEE')
+shutil.copytree(tmp_dir, tmp_dir+'/copy', copy_function=shutil.copy, ignore=shutil.ignore_patterns('copy', 'shards*', '*.sqlite*'))
+assert list(db_anti_list(tmp_dir+'/copy/test_sera.json', journal=True)) == list(reloaded_list)
+
+with open(tmp_dir+'/copy/test_sera.json', 'a') as fileobj:
+    fileobj.write(' ')
+assert len(db_anti_list(tmp_dir+'/copy/test_sera.json', journal=True)) == len(reloaded_list) - 1
+assert os.path.exists(tmp_dir+'/copy/test_sera.json.journal.stale')
+
+
+# In[30]:
+
+
+# lists can be saved as binary snapshots which are memory mapped when loaded.
+# given the json file, a snapshot which is out of date is rebuilt automatically
+
+snapshot_list = db_experiment_list.load_snapshot(tmp_dir+'/results_snapshot', json_path=database_dir+'test_results2.json')
+assert snapshot_list._load_mode == 'full'
+
+snapshot_list = db_experiment_list.load_snapshot(tmp_dir+'/results_snapshot', json_path=database_dir+'test_results2.json')
+assert snapshot_list._load_mode == 'snapshot'
+assert list(snapshot_list) == list(db_experiment_list(database_dir+'test_results2.json'))
+assert snapshot_list.titer_table(0).to_list() == snapshot_list[0]['results'][0]['titers']
+
+
+# In[31]:
+
+
+# lists can be kept in a sqlite database instead of a json file. Cross checks
+# of lists opened on the same database are done in the database
+
+from AcDb import sqlite_store
+
+store = sqlite_store(tmp_dir+'/acdb.sqlite')
+store.import_json('antigens', database_dir+'test_antigens.json')
+store.import_json('sera', database_dir+'test_sera.json')
+store.import_json('experiments', database_dir+'test_results2.json')
+
+sql_antigens = db_anti_list.from_sqlite(store, 'antigens')
+sql_sera = db_anti_list.from_sqlite(store, 'sera')
+sql_list = db_experiment_list.from_sqlite(store, 'experiments')
+
+assert list(sql_list) == list(db_experiment_list(database_dir+'test_results2.json'))
+assert sql_list.cross_check(sql_antigens, sql_sera) == \
+    db_experiment_list(database_dir+'test_results2.json').cross_check(antigen_list, serum_list)
+
+sql_antigens.pop(0)
+assert len(db_anti_list.from_sqlite(tmp_dir+'/acdb.sqlite', 'antigens')) == len(db_anti_list(database_dir+'test_antigens.json')) - 1
+
+# entries are read by key so a list is not misled by the writes of another
+# one, and its own writes are refused once another list has changed the table
+reader = db_anti_list.from_sqlite(tmp_dir+'/acdb.sqlite', 'antigens')
+writer = db_anti_list.from_sqlite(tmp_dir+'/acdb.sqlite', 'antigens')
+writer.insert(0, {'id':'NEW001', 'long':'A/NEW/1/2020'})
+eid = reader._id_list[0]
+assert reader.get_by_id(eid)['id'] == eid
+
+try:
+    reader.pop(0)
+except RuntimeError as e:
+    print(e)
+assert reader._id_list[0] == eid
+
+store.export_json('experiments', tmp_dir+'/exported.json')
+with open(tmp_dir+'/exported.json', 'rb') as fileobj1, open(database_dir+'test_results2.json', 'rb') as fileobj2:
+    assert fileobj1.read() == fileobj2.read()
+
+
+# In[32]:
+
+
+# titers and results of an antigen or serum can be looked up without scanning the list
+
+exp_list = db_experiment_list(database_dir+'test_results2.json')
+result = exp_list[0]['results'][0]
+antigen_id, serum_id = result['antigen_ids'][0], result['serum_ids'][0]
+
+assert (exp_list[0]['id'], 0, antigen_id, serum_id, result['titers'][0][0]) in exp_list.titers_for(antigen_id=antigen_id, serum_id=serum_id)
+assert len(exp_list.titers_for(antigen_id=antigen_id)) == sum(len(y['serum_ids']) for x in exp_list for y in x['results'] for z in y['antigen_ids'] if z == antigen_id)
+assert (exp_list[0]['id'], 0) in exp_list.results_with(antigen_ids=[antigen_id], assay=result['assay'])
+
+entry = exp_list[0]
+exp_list.pop(0)
+assert (entry['id'], 0) not in exp_list.results_with(antigen_ids=[antigen_id])
+
+
+# In[33]:
+
+
+# the titers of all results can be merged into one antigen x serum matrix
+
+import copy
+
+exp_list = db_experiment_list(database_dir+'test_results2.json')
+result = copy.deepcopy(exp_list[0]['results'][0])
+result['date'] = '2100-01-01'
+result['titers'] = [['80']*len(result['serum_ids']) for _ in result['antigen_ids']]
+exp_list.create_entry('Repeat', 'Repeat of the first result', [result])
+
+assert len(exp_list.titer_matrix('all')) == 2*len(exp_list.titer_matrix('latest'))
+assert exp_list.titer_matrix('latest').to_dense().to_list() == result['titers']
+
+# numeric titers are averaged, thresholded ones are taken from the latest result
+geomean = exp_list.titer_matrix('geomean', sparse=False).to_list()
+titers = exp_list[0]['results'][0]['titers']
+assert geomean[0][0] == '80' and titers[0][0] == '<10'
+assert titers[0][4] == '40/80' and geomean[0][4] == '67'  #  (40*80)**0.5 = 57 and (57*80)**0.5 = 67
+
+# a single numeric titer is kept with its own result even if a later one is thresholded
+result = copy.deepcopy(result)
+result['date'] = '2200-01-01'
+result['titers'] = [['<10']*len(result['serum_ids']) for _ in result['antigen_ids']]
+exp_list.create_entry('Thresholded repeat', 'Thresholded repeat of the first result', [result])
+
+matrix = exp_list.titer_matrix('geomean')
+cell = int(np.flatnonzero((matrix.rows == 0) & (matrix.cols == 0))[0])
+assert matrix.to_dense().to_list()[0][0] == '80' and matrix.results[matrix.sources[cell]] == (exp_list[-2]['id'], 0)
+assert matrix.to_dense().to_list()[0][4] == '67'
+
+# nothing is cached by merging, and the memory budget covers the temporary arrays
+assert len(exp_list._titer_tables) == 0
+try:
+    exp_list.titer_matrix('latest', memory_budget=3*len(matrix.values)*21 + 1)  #  enough for the merged arrays alone
+    raise RuntimeError('the memory budget was not enforced')
+except MemoryError as e:
+    print(e)
+
+
+# In[34]:
+
+
+# antigens and sera can be selected by their fields, the fields which are
+# filtered on are indexed and the indexes follow additions and removals
+
+antigen_list = db_anti_list(database_dir+'test_antigens.json')
+
+clade1 = antigen_list.filter({'groups':'clade 1', 'wildtype':False, 'passage.history':'SIAT'})
+assert clade1 == {x['id'] for x in antigen_list if 'clade 1' in x['groups']}
+assert antigen_list.filter(('or', {'groups':'clade 1'}, {'groups':'clade 2.1'})) == antigen_list.filter({'groups':{'clade 1', 'clade 2.1'}})
+
+antigen_list.append({'id':antigen_list.generate_new_id(), 'long':'A/NEW/1/2020', 'groups':['clade 1']})
+assert antigen_list[-1]['id'] in antigen_list.filter({'groups':'clade 1'})
+
+antigen_list.pop(0)
+assert antigen_list.filter({'groups':'clade 1'}) == clade1 - {'14846I'} | {antigen_list[-1]['id']}
+
+# booleans and numbers are indexed apart
+antigen_list.append({'id':antigen_list.generate_new_id(), 'long':'A/NEW/2/2020', 'wildtype':0})
+assert antigen_list[-1]['id'] not in antigen_list.filter({'wildtype':False})
+assert antigen_list.filter({'wildtype':0.0}) == {antigen_list[-1]['id']}
+
+
+# In[35]:
+
+
+# slices and views of lists are read-only lists of the same class which share
+# the entries of the list they are taken from
+
+antigen_list = db_anti_list(database_dir+'test_antigens.json')
+exp_list = db_experiment_list(database_dir+'test_results2.json')
+
+antigen_view = antigen_list[2:5]
+assert isinstance(antigen_view, db_anti_list) and antigen_view[0] is antigen_list[2]
+assert antigen_list.view(['NK4KU7', 3])._id_list[:] == ['NK4KU7', antigen_list[3]['id']]
+
+try:
+    antigen_view.pop(0)
+except TypeError as e:
+    print(e)
+    
+antigen_list.pop(0)
+assert antigen_view[0] is antigen_list[1]
+
+exp_view = exp_list.view([0])
+assert exp_view.cross_check(db_anti_list(database_dir+'test_antigens.json').view(range(10)), serum_list) == {}
+exp_view.write(tmp_dir+'/view.json')
+with open(tmp_dir+'/view.json', 'r') as fileobj:
+    assert json.load(fileobj) == [exp_list[0]]
+
+
+# In[36]:
+
+
+# with a validation cache, unchanged files and entries are not tested again on loading
+
+shutil.copy(database_dir+'test_results2.json', tmp_dir+'/cached_results.json')
+cache_dir = tmp_dir+'/validation_cache'
+
+exp_list = db_experiment_list(tmp_dir+'/cached_results.json', validation_cache=cache_dir)
+assert len(os.listdir(cache_dir)) == 1
+assert len(exp_list._untested()[0]) == 0
+
+exp_list.create_entry('New entry', 'Some description', [copy.deepcopy(exp_list[0]['results'][0])])
+exp_list._cross_check_required = False
+exp_list.write(tmp_dir+'/cached_results.json')
+
+# only the new entry is tested when the changed file is loaded
+exp_list = db_experiment_list(tmp_dir+'/cached_results.json', validation_cache=cache_dir, do_tests=False)
+assert list(exp_list._untested()[0]) == [1]
+
+
+# In[37]:
+
+
+# lists have a hash of their entries, lists can be compared entry by entry with diff
+
+exp_list1 = db_experiment_list(database_dir+'test_results2.json')
+exp_list2 = db_experiment_list(database_dir+'test_results2.json')
+assert exp_list1.root_hash() == exp_list2.root_hash()
+
+entry = copy.deepcopy(exp_list2[0])
+entry['description'] = 'Another description'
+exp_list2.pop(0)
+exp_list2.append(entry)
+exp_list2.create_entry('New entry', 'Some description', [copy.deepcopy(entry['results'][0])])
+
+assert exp_list1.root_hash() != exp_list2.root_hash()
+assert exp_list1.diff(exp_list2) == {'added':[exp_list2[1]['id']], 'removed':[], 'modified':[entry['id']]}
+
+exp_list2.pop(1)
+exp_list2.pop(0)
+exp_list2.append(exp_list1[0])
+assert exp_list1.root_hash() == exp_list2.root_hash()
+
+
+# In[38]:
+
+
+# the antigen and serum ids of results can be stored as integer codes of a vocabulary
+# which is shared by the whole list. They still read and are written like lists of ids
+
+from AcDb import interned_ids
+
+exp_list = db_experiment_list(database_dir+'test_results2.json')
+interned_list = db_experiment_list(database_dir+'test_results2.json', intern_ids=True)
+
+result = interned_list[0]['results'][0]
+assert isinstance(result['antigen_ids'], interned_ids)
+assert result['antigen_ids'] == exp_list[0]['results'][0]['antigen_ids'] and result['serum_ids'][0] == exp_list[0]['results'][0]['serum_ids'][0]
+assert interned_list.root_hash() == exp_list.root_hash()
+
+new_result = copy.deepcopy(exp_list[0]['results'][0])
+interned_list.create_entry('New entry', 'Some description', [new_result])
+assert isinstance(interned_list[-1]['results'][0]['serum_ids'], interned_ids) and isinstance(new_result['serum_ids'], list)
+
+# interned ids change like lists, without affecting copies of them
+serum_ids = interned_list[-1]['results'][0]['serum_ids']
+copied = copy.copy(serum_ids)
+serum_ids.append('NEWSER')
+serum_ids[0] = 'NEWSR0'
+assert serum_ids == ['NEWSR0'] + new_result['serum_ids'][1:] + ['NEWSER'] and copied == new_result['serum_ids']
+assert serum_ids + ['X'] == serum_ids.tolist() + ['X'] and ['X'] + serum_ids == ['X'] + serum_ids.tolist()
+del serum_ids[-1]
+serum_ids[0] = new_result['serum_ids'][0]
+assert json.loads(json.dumps(interned_list[-1], default=list)) == interned_list[-1]
+
+assert interned_list.cross_check(db_anti_list(database_dir+'test_antigens.json'), db_anti_list(database_dir+'test_sera.json')) == {}
+interned_list.write(tmp_dir+'/interned.json')
+exp_list = db_experiment_list(tmp_dir+'/interned.json')
+assert exp_list.root_hash() == interned_list.root_hash()
+
+
+# In[39]:
+
+
+# lists can be split into a directory of shards which are loaded in parallel,
+# only the shards which have changed are written again
+
+exp_list = db_experiment_list(database_dir+'test_results2.json')
+exp_list.create_entry('New entry', 'Some description', [dict(exp_list[0]['results'][0], date='2021-03-01')])
+exp_list._cross_check_required = False
+exp_list.write_shards(tmp_dir+'/shards', key=lambda x: x['results'][0]['date'][:4])
+assert sorted(os.listdir(tmp_dir+'/shards')) == ['2020.json', '2021.json', 'manifest.json']
+
+sharded_list = db_experiment_list.from_shards(tmp_dir+'/shards', shard_key=lambda x: x['results'][0]['date'][:4], executor='thread')
+assert sharded_list.root_hash() == exp_list.root_hash()
+
+modified_time = os.stat(tmp_dir+'/shards/2020.json').st_mtime_ns
+sharded_list.create_entry('Another entry', 'Some description', [dict(exp_list[0]['results'][0], date='2022-01-01')])
+sharded_list._cross_check_required = False
+sharded_list.write_shards()
+assert os.stat(tmp_dir+'/shards/2020.json').st_mtime_ns == modified_time
+assert len(db_experiment_list.from_shards(tmp_dir+'/shards', workers=1)) == 3
+
+# shards which are emptied are removed, and a list re-keyed in its own directory takes the new layout
+sharded_list.pop(len(sharded_list) - 1)
+sharded_list.write_shards()
+assert sorted(os.listdir(tmp_dir+'/shards')) == ['2020.json', '2021.json', 'manifest.json']
+
+sharded_list.write_shards(key=lambda x: 'all')
+assert sorted(os.listdir(tmp_dir+'/shards')) == ['all.json', 'manifest.json']
+sharded_list.create_entry('Another entry', 'Some description', [dict(exp_list[0]['results'][0], date='2022-01-01')])
+sharded_list.write_shards()
+assert sorted(os.listdir(tmp_dir+'/shards')) == ['2022.json', 'all.json', 'manifest.json']
+assert len(db_experiment_list.from_shards(tmp_dir+'/shards', workers=1)) == 3
+
+# the entries of the shards are checked as when loading a json file
+with open(tmp_dir+'/shards/all.json', 'r') as fileobj:
+    shard = json.load(fileobj)
+shard[0]['results'][0]['titers'][0][0] = 'garbage!!'
+with open(tmp_dir+'/shards/all.json', 'w') as fileobj:
+    json.dump(shard, fileobj)
+
+try:
+    db_experiment_list.from_shards(tmp_dir+'/shards', workers=1)
+    raise RuntimeError('a corrupted shard was loaded')
+except AssertionError as e:
+    assert 'garbage!!' in str(e)
+
+
+# In[40]:
+
+
+# lists can record statistics of their operations
+
+records = []
+exp_list = db_experiment_list(database_dir+'test_results2.json', instrument=lambda db, op, record: records.append(op), trace_memory=True)
+exp_list.cross_check(db_anti_list(database_dir+'test_antigens.json'), db_anti_list(database_dir+'test_sera.json'))
+exp_list.generate_new_id()
+exp_list.write(tmp_dir+'/instrumented.json')
+
+stats = exp_list.stats()
+assert stats['load']['entries'] == len(exp_list) and stats['load']['bytes_read'] == os.path.getsize(database_dir+'test_results2.json')
+assert stats['load']['peak_memory'] > 0
+assert stats['_check_result']['calls'] == stats['_test']['entries'] == len(exp_list)
+assert stats['write']['bytes_written'] == os.path.getsize(tmp_dir+'/instrumented.json')
+assert stats['generate_new_ids']['entries'] == 1
+assert records[0] == '_parent_tests' and records[-1] == 'write'
+
+exp_list.instrument(False)
+exp_list.generate_new_id()
+assert exp_list.stats() == {}
+
+
+# In[41]:
+
+
+# the titers of all the results can be exported row by row
+
+exp_list = db_experiment_list(database_dir+'test_results2.json')
+result = exp_list[0]['results'][0]
+
+rows = list(exp_list.titer_rows())
+assert len(rows) == len(result['antigen_ids'])*len(result['serum_ids'])
+assert rows[1] == (exp_list[0]['id'], 0, result['assay'], result['date'], result['antigen_ids'][0], result['serum_ids'][1], result['titers'][0][1])
+
+assert len(list(exp_list.titer_rows(assay='MN'))) == 0
+assert len(list(exp_list.titer_rows(dates=(result['date'], None), antigen_ids={result['antigen_ids'][2]}))) == len(result['serum_ids'])
+
+exp_list.write_titers_csv(tmp_dir+'/titers.csv', chunk_size=7)
+with open(tmp_dir+'/titers.csv', 'r') as fileobj:
+    assert len(fileobj.readlines()) == len(rows) + 1
+
+records = exp_list.titer_records(serum_ids={result['serum_ids'][0]})
+assert len(records) == len(result['antigen_ids']) and list(records['titer']) == [x[0] for x in result['titers']]
+
+# exporting a snapshot list does not keep the entries or their titer tables
+snapshot_list = db_experiment_list.load_snapshot(tmp_dir+'/results_snapshot')
+assert len(list(snapshot_list.titer_rows())) == len(rows)
+assert len(snapshot_list._titer_tables) == 0 and all(isinstance(x, tuple) for x in snapshot_list._list._items)
+
+# string fields are as wide as their longest value and missing dates are empty
+exp_list[0]['results'][0]['assay'] = 'Microneutralisation assay'
+del exp_list[0]['results'][0]['date']
+records = exp_list.titer_records(experiment_ids={exp_list[0]['id']})
+assert set(records['assay']) == {'Microneutralisation assay'} and set(records['date']) == {''}